@@ -0,0 +1,82 @@
+# adaptive.py
+# Chooses the next power poll interval from how fast the readings are moving
+# and the time of day, within [min_s, max_s]. Errors and rate limiting back
+# the interval off exponentially until a good sample comes in again.
+import threading
+from datetime import datetime
+from catalog import POWER_FIELDS
+
+FIELDS = POWER_FIELDS
+
+def parse_hours(spec):
+    """'22-6' -> (22, 6); empty -> None."""
+    if not spec:
+        return None
+    start, end = spec.split("-")
+    return int(start), int(end)
+
+class AdaptiveInterval:
+    def __init__(self, base_s, min_s=10, max_s=300, fast_delta=300, slow_delta=50,
+                 idle_watts=50, quiet_hours=None, max_backoff_s=900, clock=datetime.now):
+        self.base_s = base_s
+        self.min_s = min_s
+        self.max_s = max_s
+        self.fast_delta = fast_delta
+        self.slow_delta = slow_delta
+        self.idle_watts = idle_watts
+        self.quiet_hours = quiet_hours
+        # Backing off never shortens the interval below the normal ceiling
+        self.max_backoff_s = max(max_backoff_s, max_s)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.last = {}          # system key -> last power_stats
+        self.activity = 0.0     # largest per-field change seen since the last decision
+        self.idle = False
+        self.errors = 0
+        self.interval = base_s
+
+    def record(self, key, stats):
+        """Feed one power_stats sample; a good sample also clears any error backoff."""
+        with self.lock:
+            prev = self.last.get(key)
+            self.last[key] = stats
+            if prev:
+                delta = max(abs(float(stats.get(f) or 0) - float(prev.get(f) or 0)) for f in FIELDS)
+                self.activity = max(self.activity, delta)
+            self.idle = all(float(s.get("pv_production") or 0) <= 0 and
+                            abs(float(s.get("battery") or 0)) < self.idle_watts
+                            for s in self.last.values())
+            self.errors = 0
+
+    def record_error(self, rate_limited=False):
+        with self.lock:
+            # A rate limit is a clearer signal to back off than a transient error
+            self.errors += 2 if rate_limited else 1
+
+    def in_quiet_hours(self):
+        if not self.quiet_hours:
+            return False
+        start, end = self.quiet_hours
+        hour = self.clock().hour
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def backoff_factor(self):
+        return 2 ** min(self.errors, 10)
+
+    def next_interval(self):
+        """Decide the interval until the next power poll."""
+        with self.lock:
+            if self.errors:
+                self.interval = min(max(self.interval, self.base_s) * 2, self.max_backoff_s)
+                return self.interval
+            activity, self.activity = self.activity, 0.0
+            if activity >= self.fast_delta:
+                target = self.min_s
+            elif activity <= self.slow_delta:
+                # Stretch out while nothing moves; only past base when idle or quiet
+                ceiling = self.max_s if (self.idle or self.in_quiet_hours()) else self.base_s
+                target = min(self.interval * 1.5, ceiling)
+            else:
+                target = self.base_s
+            self.interval = max(self.min_s, min(self.max_s, target))
+            return self.interval
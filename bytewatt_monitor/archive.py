@@ -0,0 +1,166 @@
+# archive.py
+# Raw API response archive. Every response is appended as one NDJSON line
+#   {"ts": epoch seconds, "url": ..., "status": ..., "body": raw text}
+# to a per-day gzip file. Lines are buffered and written as one gzip member
+# per block, so the file grows incrementally and stays a valid .gz (zcat
+# reads it whole). A sidecar <day>.idx holds a fixed-width (timestamp, member
+# offset) entry per line, so a time range is read by decompressing only the
+# members it touches.
+#
+#   python3 archive.py /data/archive 2026-10-16T12:00 [2026-10-16T13:00]
+import json, os, struct, sys, threading, time, zlib
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+INDEX = struct.Struct("<dQ")
+
+def _day(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y%m%d")
+
+def _gzip_member(data):
+    c = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+def _read_member(f, offset):
+    """Decompress the single gzip member starting at offset."""
+    f.seek(offset)
+    d = zlib.decompressobj(31)
+    out = []
+    while not d.eof:
+        chunk = f.read(65536)
+        if not chunk:
+            break
+        out.append(d.decompress(chunk))
+    return b"".join(out)
+
+class ResponseArchive:
+    """Files live at <root>/<YYYYMMDD>.ndjson.gz with <root>/<YYYYMMDD>.idx beside them."""
+    def __init__(self, root, block_records=64, block_seconds=60, retention_days=30, clock=time.time):
+        self.root = root
+        self.block_records = block_records
+        self.block_seconds = block_seconds
+        self.retention_days = retention_days
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.block = []          # (ts, line) not yet on disk
+        self.block_day = None
+        self.block_started = 0.0
+        self.trimmed = set()     # days whose index has been checked for a torn entry
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, day):
+        return (os.path.join(self.root, f"{day}.ndjson.gz"),
+                os.path.join(self.root, f"{day}.idx"))
+
+    def write(self, url, status, body, ts=None):
+        """Append one response; written out when the block is full or old enough."""
+        ts = ts or self.clock()
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        line = json.dumps({"ts": ts, "url": url, "status": status, "body": body},
+                          separators=(",", ":")).encode() + b"\n"
+        with self.lock:
+            day = _day(ts)
+            if self.block and day != self.block_day:
+                self._flush()
+            if not self.block:
+                self.block_day = day
+                self.block_started = time.monotonic()
+            self.block.append((ts, line))
+            if (len(self.block) >= self.block_records or
+                    time.monotonic() - self.block_started >= self.block_seconds):
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.block:
+            return
+        data, index = self._paths(self.block_day)
+        member = _gzip_member(b"".join(line for _, line in self.block))
+        try:
+            with open(data, "ab") as f:
+                offset = f.tell()
+                f.write(member)
+            # Index after data: an entry always points at a complete member
+            with open(index, "ab") as f:
+                if self.block_day not in self.trimmed:
+                    # A crash mid-entry would shift every entry appended after it
+                    f.truncate(f.tell() - f.tell() % INDEX.size)
+                    self.trimmed.add(self.block_day)
+                f.write(b"".join(INDEX.pack(ts, offset) for ts, _ in self.block))
+        except OSError as e:
+            print(f"Error writing response archive: {e}")
+        self.block = []
+
+    def _index(self, day):
+        try:
+            with open(self._paths(day)[1], "rb") as f:
+                raw = f.read()
+        except OSError:
+            return []
+        usable = len(raw) - len(raw) % INDEX.size
+        return [INDEX.unpack_from(raw, i) for i in range(0, usable, INDEX.size)]
+
+    def read(self, start, end=None):
+        """Archived responses with start <= ts < end (epoch seconds) as dicts, oldest first."""
+        end = end if end is not None else start + 1e-6
+        self.flush()
+        day = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0)
+        while day.timestamp() < end:
+            entries = self._index(day.strftime("%Y%m%d"))
+            times = [ts for ts, _ in entries]
+            offsets = []
+            for ts, offset in entries[bisect_left(times, start):]:
+                if ts >= end:
+                    break
+                if not offsets or offsets[-1] != offset:
+                    offsets.append(offset)
+            if offsets:
+                with open(self._paths(day.strftime("%Y%m%d"))[0], "rb") as f:
+                    for offset in offsets:
+                        for line in _read_member(f, offset).splitlines():
+                            rec = json.loads(line)
+                            if start <= rec["ts"] < end:
+                                yield rec
+            day += timedelta(days=1)
+
+    def nearest(self, ts):
+        """The archived response closest in time to ts on the same day, or None."""
+        self.flush()
+        entries = self._index(_day(ts))
+        if not entries:
+            return None
+        i = bisect_left([t for t, _ in entries], ts)
+        best = min(entries[max(i - 1, 0):i + 1], key=lambda e: abs(e[0] - ts))[0]
+        return next(self.read(best, best + 1e-6), None)
+
+    def prune(self, now=None):
+        """Delete days older than retention_days."""
+        cutoff = ((now or datetime.now()) - timedelta(days=self.retention_days)).strftime("%Y%m%d")
+        for name in os.listdir(self.root):
+            if name[:8].isdigit() and name[:8] < cutoff:
+                os.remove(os.path.join(self.root, name))
+
+    def close(self):
+        self.flush()
+
+def parse_time(value):
+    """Epoch seconds from an ISO date/time or a number."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: archive.py ROOT START [END]")
+        sys.exit(2)
+    start = parse_time(sys.argv[2])
+    end = parse_time(sys.argv[3]) if len(sys.argv) > 3 else None
+    archive = ResponseArchive(sys.argv[1])
+    records = archive.read(start, end) if end else filter(None, [archive.nearest(start)])
+    for rec in records:
+        print(json.dumps(rec))
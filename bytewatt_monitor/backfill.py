@@ -0,0 +1,152 @@
+# backfill.py
+# Catches up on daily getStaticsByDay summaries missed while the add-on was
+# down. Missing days are fetched with a small pool of parallel requests on a
+# background thread, and an on-disk index records each day's outcome so every
+# day is fetched at most once. A day that keeps failing is given up on after
+# max_attempts tries rather than retried every night; a rejected login says
+# nothing about the day, so it is retried on the next run without counting.
+import json, os, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+# Index states that mean "done, do not fetch again"; a failing day is
+# "failed:<attempts>" until it succeeds or reaches max_attempts
+DONE = ("saved", "empty", "gave_up")
+
+class SessionRejected(Exception):
+    """Raised by a fetch when the cloud does not accept the session it was given."""
+
+def attempts(state):
+    """Failed attempts recorded by an index state (a bare "failed" is one)."""
+    if not state or not state.startswith("failed"):
+        return 0
+    return int(state.partition(":")[2] or 1)
+
+def summary_day(stats, date_param="queryDate"):
+    """The YYYYMMDD day a getStaticsByDay summary says it covers, or None if it does not say."""
+    for key in (date_param, "queryDate", "date", "theDate", "statDate"):
+        digits = "".join(c for c in str(stats.get(key) or "") if c.isdigit())
+        if len(digits) >= 8:
+            return digits[:8]
+    return None
+
+undated_summaries = threading.Event()   # set once the warning below is logged
+
+def get_statics(session, path, auth_error):
+    """The data of a getStaticsByDay response; auth_error(resp) says the login was rejected."""
+    resp = session.get(path)
+    if auth_error(resp):
+        # Only this backfill fails; live polling notices an expired login itself
+        raise SessionRejected()
+    data = resp.json()
+    if resp.status != 200 or data.get("code") != 200:
+        raise RuntimeError(f"HTTP {resp.status}, code {data.get('code')}")
+    return data.get("data") or None
+
+def fetch_statics_for_day(session, path, day, auth_error, date_param="queryDate"):
+    """getStaticsByDay (at path, for one system) for a past YYYYMMDD day; None if the cloud has nothing for it.
+
+    A cloud that ignores the date parameter answers with today's figures,
+    which must not be filed under the past day (or mark it done). A dated
+    summary must be for that day; an undated one must differ from today's.
+    """
+    stats = get_statics(session, path + f"&{date_param}={day[:4]}-{day[4:6]}-{day[6:]}", auth_error)
+    if stats:
+        covered = summary_day(stats, date_param)
+        if covered is None:
+            if stats == get_statics(session, path, auth_error):
+                raise RuntimeError("undated summary is the same as today's")
+            if not undated_summaries.is_set():
+                undated_summaries.set()
+                print("Warning: daily summaries carry no date; backfilled days are only "
+                      "checked to differ from today's figures")
+        elif covered != day:
+            raise RuntimeError(f"asked for {day}, got the summary for {covered}")
+    return stats
+
+class Backfill:
+    def __init__(self, index_path, save, have, concurrency=2, max_attempts=5):
+        """save(system, day, data) stores a summary; have(system, day) says one is already on disk.
+
+        day is a YYYYMMDD string.
+        """
+        self.index_path = index_path
+        self.save = save
+        self.have = have
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.running = threading.Lock()
+        self.index = self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _mark(self, system, day, state):
+        with self.lock:
+            self.index.setdefault(system["sys_sn"], {})[day] = state
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.index, f)
+            os.replace(tmp, self.index_path)
+
+    def missing(self, systems, days, today=None):
+        """(system, day) pairs in the last `days` days (not today) with no summary yet."""
+        today = today or date.today()
+        out = []
+        for system in systems:
+            done = self.index.get(system["sys_sn"], {})
+            for n in range(1, days + 1):
+                day = (today - timedelta(days=n)).strftime("%Y%m%d")
+                if done.get(day) not in DONE and not self.have(system, day):
+                    out.append((system, day))
+        return out
+
+    def _one(self, fetch, system, day):
+        try:
+            data = fetch(system, day)
+        except SessionRejected:
+            print(f"Backfill of {day} for {system['name']} skipped: session rejected")
+            return False
+        except Exception as e:
+            tries = attempts(self.index.get(system["sys_sn"], {}).get(day)) + 1
+            if tries >= self.max_attempts:
+                print(f"Backfill of {day} for {system['name']} failed: {e}; giving up after {tries} attempts")
+                self._mark(system, day, "gave_up")
+            else:
+                print(f"Backfill of {day} for {system['name']} failed: {e}")
+                self._mark(system, day, f"failed:{tries}")
+            return False
+        if data:
+            self.save(system, day, data)
+        self._mark(system, day, "saved" if data else "empty")
+        return True
+
+    def run(self, systems, days, fetch):
+        """Fetch every missing day with fetch(system, day) -> data or None.
+
+        Returns the number of days fetched successfully.
+        """
+        if not self.running.acquire(blocking=False):
+            return 0
+        try:
+            todo = self.missing(systems, days)
+            if not todo:
+                return 0
+            print(f"Backfilling {len(todo)} missing daily summaries...")
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                ok = sum(pool.map(lambda job: self._one(fetch, *job), todo))
+            print(f"Backfill done: {ok}/{len(todo)} days fetched")
+            return ok
+        finally:
+            self.running.release()
+
+    def start(self, systems, days, fetch):
+        """Run in the background so live polling is never held up."""
+        t = threading.Thread(target=self.run, args=(systems, days, fetch), daemon=True)
+        t.start()
+        return t
@@ -0,0 +1,161 @@
+# bench.py
+# Replay benchmark: runs the add-on as a subprocess against the local fake
+# cloud and the in-process MQTT broker, for N power poll cycles, and reports
+# poll-to-publish latency percentiles, CPU time, peak RSS and startup time.
+#
+#   python3 bench.py --cycles 50 --interval 1 [--fixtures recorded.json]
+#   python3 bench.py --save-baseline baseline.json
+#   python3 bench.py --baseline baseline.json --threshold 0.2   # exit 1 on regression
+import argparse, json, os, shutil, signal, subprocess, sys, tempfile, time
+from bisect import bisect_right
+from fakebroker import FakeBroker
+from fakecloud import FakeCloud
+import procstats
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+POWER_PATH = "/api/report/energyStorage/getLastPowerData"
+
+# Metrics where larger is worse, compared against the baseline
+CHECKED = ("latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "cpu_seconds",
+           "peak_rss_mb", "startup_seconds")
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def publish_latencies(cloud, broker, topic):
+    """Seconds from each power response leaving the cloud to its MQTT publish arriving."""
+    answered = sorted(t for t, path in cloud.requests if path == POWER_PATH)
+    out = []
+    for t, msg_topic, _, _ in broker.messages:
+        if msg_topic != topic:
+            continue
+        i = bisect_right(answered, t)
+        if i:
+            out.append(t - answered[i - 1])
+    return out
+
+def run_bench(args):
+    cloud = FakeCloud(fixtures=args.fixtures, latency=args.latency, jitter=args.jitter,
+                      error_rate=args.error_rate, username="bench", password="bench").start()
+    broker = FakeBroker().start()
+    work = tempfile.mkdtemp(prefix="bytewatt-bench-")
+    try:
+        session_file = os.path.join(work, "session.json")
+        if args.mode == "direct":
+            # Skip the browser login entirely: hand the add-on a valid session
+            with open(session_file, "w") as f:
+                json.dump({"headers": {"Authorization": f"Bearer {cloud.issue_token()}"}}, f)
+        env = dict(os.environ,
+                   MQTT_BROKER="127.0.0.1", MQTT_PORT=str(broker.port),
+                   MQTT_TOPIC_PREFIX="bench", SYS_SN="BENCH", STATION_ID="", SYSTEMS="",
+                   BYTEWATT_URL=cloud.url, BYTEWATT_USERNAME="bench", BYTEWATT_PASSWORD="bench",
+                   POLL_MODE=args.mode, PUBLISH_MODE="json",
+                   POLL_INTERVAL_POWER=str(args.interval),
+                   POLL_INTERVAL_ENERGY=str(args.interval * 2),
+                   POLL_INTERVAL_STATICS=str(args.interval * 30),
+                   DATA_DIR=os.path.join(work, "data"), SPOOL_DIR=os.path.join(work, "spool"),
+                   SESSION_FILE=session_file, DISCOVERY_CACHE=os.path.join(work, "discovery_hashes.json"),
+                   PYTHONUNBUFFERED="1")
+        topic = "bench/power_data"
+
+        start = time.monotonic()
+        proc = subprocess.Popen([sys.executable, os.path.join(HERE, "run.py")], cwd=HERE, env=env,
+                                stdout=subprocess.DEVNULL if not args.verbose else None)
+        peak_tree = 0
+        first_publish = None
+        deadline = start + args.timeout
+        try:
+            while time.monotonic() < deadline and proc.poll() is None:
+                tree = procstats.rss_bytes(proc.pid) + sum(
+                    procstats.rss_bytes(c) for c in procstats.children(proc.pid))
+                peak_tree = max(peak_tree, tree)
+                published = [m for m in broker.messages if m[1] == topic]
+                if published and first_publish is None:
+                    first_publish = published[0][0]
+                if len(published) >= args.cycles:
+                    break
+                time.sleep(0.05)
+        finally:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGINT)
+        try:
+            _, status, usage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            usage = None
+        cloud.stop()
+        broker.stop()
+    finally:
+        # Data, spool and session of the run are of no use afterwards
+        shutil.rmtree(work, ignore_errors=True)
+
+    latencies = publish_latencies(cloud, broker, topic)
+    return {
+        "mode": args.mode,
+        "cycles": len(latencies),
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "latency_max_ms": max(latencies, default=0) * 1000,
+        "cpu_seconds": (usage.ru_utime + usage.ru_stime) if usage else 0.0,
+        # ru_maxrss covers the Python process; the sampled tree adds the browser
+        "peak_rss_mb": max(usage.ru_maxrss * 1024 if usage else 0, peak_tree) / 2**20,
+        "startup_seconds": (first_publish - start) if first_publish else float("inf"),
+        "cloud_requests": cloud.request_count,
+    }
+
+def check_regressions(result, baseline, threshold):
+    """Names of metrics that got worse than baseline by more than threshold (a fraction)."""
+    worse = []
+    for key in CHECKED:
+        old, new = baseline.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        # Small absolute noise on near-zero values is not a regression
+        if new > old * (1 + threshold) and new - old > 1e-3:
+            worse.append(f"{key}: {old:.3f} -> {new:.3f}")
+    return worse
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay benchmark for the ByteWatt add-on")
+    ap.add_argument("--mode", choices=("direct", "browser"), default="direct")
+    ap.add_argument("--cycles", type=int, default=30, help="power poll cycles to wait for")
+    ap.add_argument("--interval", type=float, default=1.0, help="seconds between power polls")
+    ap.add_argument("--fixtures", help="JSON file of recorded responses per endpoint path")
+    ap.add_argument("--latency", type=float, default=0.0, help="fake cloud latency in seconds")
+    ap.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered 500")
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--baseline", help="compare against this saved result")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    ap.add_argument("--save-baseline", help="write the result here")
+    ap.add_argument("--verbose", action="store_true", help="show the add-on's own output")
+    args = ap.parse_args()
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            args.fixtures = json.load(f)
+
+    result = run_bench(args)
+    for key, value in result.items():
+        print(f"{key:>18}: {value:.3f}" if isinstance(value, float) else f"{key:>18}: {value}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            worse = check_regressions(result, json.load(f), args.threshold)
+        if worse:
+            print("Regressions beyond threshold:")
+            for line in worse:
+                print("  " + line)
+            sys.exit(1)
+        print("No regressions beyond threshold.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# catalog.py
+# Every field the add-on publishes, declared once. Each group is one MQTT
+# state topic (<prefix>[/<sn>]/<group>); its sensors name the published
+# field, the API key it is read from (None when computed locally) and how
+# Home Assistant should present it. The process_* handlers extract fields
+# from here and discovery is generated from here, so adding a sensor is a
+# one-line change.
+import hashlib
+
+def sensor(field, source, name, unit, device_class=None, state_class="measurement",
+           uid=None, scale=""):
+    """uid defaults to the field name; scale is appended to the value template (e.g. " / 1000")."""
+    return {"field": field, "source": source, "name": name, "unit": unit,
+            "device_class": device_class, "state_class": state_class,
+            "uid": uid or field, "scale": scale}
+
+CATALOG = {
+    # getLastPowerData, in W
+    "power_data": {"key": "power_stats", "sensors": [
+        sensor("pv_production", "pvPower", "Current Solar Production", "W", "power",
+               uid="current_solar_production"),
+        sensor("load", "powerLoad", "Current Power Load Requirements", "W", "power", uid="current_load"),
+        sensor("battery", "batteryPower", "Battery Power", "W", "power", uid="battery_power"),
+        sensor("grid", "gridPower", "Grid Power", "W", "power", uid="grid_power"),
+        sensor("soc", "soc", "Battery State of Charge", "%", "battery", uid="battery_soc"),
+    ]},
+    # getEnergyStatistics: today's counters in Wh, shown in kWh
+    "energy_stats": {"key": "energy_stats", "sensors": [
+        sensor("solar_today", "epvT", "Today’s Solar Energy (kWh)", "kWh", "energy",
+               "total_increasing", scale=" / 1000"),
+        sensor("total_consumption", "eload", "Today’s Consumption (kWh)", "kWh", "energy",
+               "total_increasing", uid="consumption_today", scale=" / 1000"),
+        sensor("feed_in", "eout", "Today’s Grid Feed-in (kWh)", "kWh", "energy",
+               "total_increasing", uid="feed_in_today", scale=" / 1000"),
+        sensor("grid_import", "einput", "Today’s Grid Import (kWh)", "kWh", "energy",
+               "total_increasing", uid="grid_import_today", scale=" / 1000"),
+        sensor("battery_charge", "echarge", "Today’s Battery Charge (kWh)", "kWh", "energy",
+               "total_increasing", uid="battery_charge_today", scale=" / 1000"),
+        sensor("battery_discharge", "edischarge", "Today’s Battery Discharge (kWh)", "kWh", "energy",
+               "total_increasing", uid="battery_discharge_today", scale=" / 1000"),
+        sensor("self_consumption", "eselfConsumption", "Self-Consumption", "%"),
+        sensor("self_sufficiency", "eselfSufficiency", "Self-Sufficiency", "%"),
+    ]},
+    # getStaticsByDay, already in kWh
+    "statics_by_day": {"key": "statics_by_day", "sensors": [
+        sensor("pv", "epv", "Daily Statistics Solar Energy", "kWh", "energy", "total_increasing",
+               uid="statics_pv"),
+        sensor("load", "eload", "Daily Statistics Consumption", "kWh", "energy", "total_increasing",
+               uid="statics_load"),
+        sensor("feed_in", "eout", "Daily Statistics Grid Feed-in", "kWh", "energy", "total_increasing",
+               uid="statics_feed_in"),
+        sensor("grid_import", "einput", "Daily Statistics Grid Import", "kWh", "energy", "total_increasing",
+               uid="statics_grid_import"),
+        sensor("battery_charge", "echarge", "Daily Statistics Battery Charge", "kWh", "energy",
+               "total_increasing", uid="statics_battery_charge"),
+        sensor("battery_discharge", "edischarge", "Daily Statistics Battery Discharge", "kWh", "energy",
+               "total_increasing", uid="statics_battery_discharge"),
+    ]},
+    # Integrated locally from power_data (rollups.py)
+    "local_energy": {"key": "local_energy", "local": True, "sensors": [
+        sensor("pv_kwh", None, "Local Solar Energy Today", "kWh", "energy", "total_increasing",
+               uid="local_pv_kwh"),
+        sensor("load_kwh", None, "Local Consumption Today", "kWh", "energy", "total_increasing",
+               uid="local_load_kwh"),
+        sensor("battery_charge_kwh", None, "Local Battery Charge Today", "kWh", "energy",
+               "total_increasing", uid="local_battery_charge_kwh"),
+        sensor("battery_discharge_kwh", None, "Local Battery Discharge Today", "kWh", "energy",
+               "total_increasing", uid="local_battery_discharge_kwh"),
+        sensor("grid_import_kwh", None, "Local Grid Import Today", "kWh", "energy", "total_increasing",
+               uid="local_grid_import_kwh"),
+        sensor("grid_export_kwh", None, "Local Grid Export Today", "kWh", "energy", "total_increasing",
+               uid="local_grid_export_kwh"),
+        sensor("pv_production_mean_15m", None, "Solar Production 15 min Average", "W", "power"),
+        sensor("load_mean_15m", None, "Load 15 min Average", "W", "power"),
+    ]},
+}
+
+# JSON key each group's stats live under in its payload
+GROUP_KEYS = {group: spec["key"] for group, spec in CATALOG.items()}
+
+def fields(group, device_class=None):
+    """Names of a group's fields read from the API, optionally only those of one device class."""
+    return tuple(s["field"] for s in CATALOG[group]["sensors"]
+                 if s["source"] and (device_class is None or s["device_class"] == device_class))
+
+# The power flows (W) that local energy and the adaptive interval work from
+POWER_FIELDS = fields("power_data", "power")
+
+def extract(group, data):
+    """The group's fields pulled out of an API `data` object (missing ones as 0)."""
+    return {s["field"]: data.get(s["source"], 0)
+            for s in CATALOG[group]["sensors"] if s["source"]}
+
+def diff_configs(configs, old, force=False):
+    """Compare discovery configs ({topic: JSON body}) with the hashes of the last run.
+
+    Returns (hashes, topics to publish, topics to remove): new or changed
+    configs (every one if force), and configs no longer generated.
+    """
+    hashes = {topic: hashlib.sha1(body.encode()).hexdigest() for topic, body in configs.items()}
+    changed = [topic for topic in configs if force or old.get(topic) != hashes[topic]]
+    removed = sorted(old.keys() - hashes.keys())
+    return hashes, changed, removed
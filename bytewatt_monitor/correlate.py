@@ -0,0 +1,77 @@
+# correlate.py
+# Ties API responses back to the poll cycle that asked for them. Every poll
+# cycle gets a sequence number; each (system, endpoint) request is tagged
+# with it, limited to max_in_flight at a time and given a deadline. A
+# response from an older cycle than one already handled is dropped, so a
+# slow answer can never overwrite newer retained state.
+import threading, time
+import metrics
+
+REQUEST_SECONDS = metrics.Histogram("bytewatt_request_seconds", "Round trip of an API call", ["endpoint"])
+TIMEOUTS = metrics.Counter("bytewatt_request_timeouts_total", "Requests past their deadline", ["endpoint"])
+STALE    = metrics.Counter("bytewatt_stale_responses_total", "Responses dropped as older than one handled",
+                           ["endpoint"])
+SKIPPED  = metrics.Counter("bytewatt_requests_skipped_total", "Requests not sent: in-flight limit reached",
+                           ["endpoint"])
+FAILED   = metrics.Counter("bytewatt_requests_failed_total", "Requests that got no response", ["endpoint"])
+
+class RequestTracker:
+    """Requests are keyed by (system serial, endpoint name)."""
+    def __init__(self, deadline=10.0, max_in_flight=1, clock=time.monotonic):
+        self.deadline = deadline
+        self.max_in_flight = max_in_flight
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.cycle = 0
+        self.pending = {}     # key -> {seq: monotonic start}
+        self.handled = {}     # key -> newest seq whose response was accepted
+
+    def next_cycle(self):
+        with self.lock:
+            self.cycle += 1
+            return self.cycle
+
+    def expire(self):
+        """Give up on requests past their deadline, freeing their in-flight slots."""
+        now = self.clock()
+        with self.lock:
+            for key, requests in self.pending.items():
+                for seq in [s for s, started in requests.items() if now - started > self.deadline]:
+                    del requests[seq]
+                    TIMEOUTS.inc(endpoint=key[1])
+                    print(f"{key[1]} request of cycle {seq} for {key[0] or 'system'} timed out")
+
+    def begin(self, key, seq):
+        """Register a request for cycle seq; False if the key is at its in-flight limit."""
+        self.expire()
+        with self.lock:
+            requests = self.pending.setdefault(key, {})
+            if len(requests) >= self.max_in_flight:
+                SKIPPED.inc(endpoint=key[1])
+                return False
+            requests[seq] = self.clock()
+            return True
+
+    def complete(self, key, seq):
+        """Record a response; False if it is older than one already accepted (drop it).
+
+        Untagged responses (seq None, e.g. replayed from the archive) are always accepted.
+        """
+        if seq is None:
+            return True
+        with self.lock:
+            started = self.pending.get(key, {}).pop(seq, None)
+            if started is not None:
+                REQUEST_SECONDS.observe(self.clock() - started, endpoint=key[1])
+            if seq <= self.handled.get(key, 0):
+                STALE.inc(endpoint=key[1])
+                return False
+            self.handled[key] = seq
+            return True
+
+    def fail(self, key, seq, timed_out=False):
+        """A request ended without a response (error, abort or transport timeout)."""
+        with self.lock:
+            if self.pending.get(key, {}).pop(seq, None) is None:
+                return      # already expired
+        (TIMEOUTS if timed_out else FAILED).inc(endpoint=key[1])
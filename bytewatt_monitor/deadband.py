@@ -0,0 +1,75 @@
+# deadband.py
+# Publish-on-change for per-field MQTT topics. A value goes out only when it
+# moves past its deadband since the last value sent, or when the last send is
+# older than max_age (heartbeat; 0 turns heartbeats off). Optionally changes are held and coalesced
+# for a batch window, then flushed together.
+import threading, time
+
+class FieldPublisher:
+    def __init__(self, abs_band=0.0, rel_band=0.0, max_age=300, overrides=None,
+                 batch_seconds=0, retain=True, clock=time.monotonic):
+        self.abs_band = abs_band
+        self.rel_band = rel_band
+        self.max_age = max_age
+        # field name -> {"abs": x, "rel": y}
+        self.overrides = overrides or {}
+        self.batch_seconds = batch_seconds
+        self.retain = retain
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sent = {}       # topic -> (value, monotonic time sent)
+        self.pending = {}    # topic -> value waiting for the next flush
+        self.published = 0
+        self.suppressed = 0
+
+    def _bands(self, topic):
+        field = topic.rsplit("/", 1)[-1]
+        band = self.overrides.get(field, {})
+        return band.get("abs", self.abs_band), band.get("rel", self.rel_band)
+
+    def changed(self, topic, value, now):
+        """True if value should be sent for topic at monotonic time now."""
+        last = self.sent.get(topic)
+        if last is None:
+            return True
+        last_value, last_time = last
+        if self.max_age and now - last_time >= self.max_age:
+            return True
+        try:
+            delta = abs(float(value) - float(last_value))
+        except (TypeError, ValueError):
+            return value != last_value
+        abs_band, rel_band = self._bands(topic)
+        if abs_band == 0 and rel_band == 0:
+            return delta > 0
+        if abs_band and delta > abs_band:
+            return True
+        return bool(rel_band) and delta > rel_band * abs(float(last_value))
+
+    def offer(self, client, topic, value):
+        """Send (or queue, when batching) value if it passes the deadband."""
+        now = self.clock()
+        with self.lock:
+            if not self.changed(topic, value, now):
+                self.suppressed += 1
+                self.pending.pop(topic, None)
+                return False
+            if self.batch_seconds:
+                self.pending[topic] = value
+                return True
+            self.sent[topic] = (value, now)
+            self.published += 1
+        client.publish(topic, str(value), retain=self.retain)
+        return True
+
+    def flush(self, client):
+        """Send everything held for the batch window."""
+        now = self.clock()
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            for topic, value in batch.items():
+                self.sent[topic] = (value, now)
+            self.published += len(batch)
+        for topic, value in batch.items():
+            client.publish(topic, str(value), retain=self.retain)
+        return len(batch)
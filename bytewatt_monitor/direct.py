@@ -0,0 +1,52 @@
+# direct.py
+# Browserless polling engine: once a session has been captured from a browser
+# login, the report endpoints are called straight over a keep-alive HTTP pool.
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import Timeout as RequestTimeout
+
+# Request headers that must not be replayed from the captured browser request
+SKIP_HEADERS = {"host", "content-length", "connection", "accept-encoding", "cookie", "x-poll-seq"}
+
+class ApiResponse:
+    """Minimal stand-in for a Playwright response, as used by the process_* handlers."""
+    def __init__(self, url, status, body, seq=None):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.seq = seq      # poll cycle the request was tagged with
+        self._json = None
+
+    def json(self):
+        if self._json is None:
+            self._json = json.loads(self.body)
+        return self._json
+
+class DirectSession:
+    """Pooled HTTP session against the ByteWatt cloud."""
+    def __init__(self, base_url, pool_size=4, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def set_auth(self, auth):
+        """Apply a captured session: {"headers": {...}, "cookies": [{name, value, domain, path}]}."""
+        self.session.headers.update({
+            k: v for k, v in auth.get("headers", {}).items()
+            if k.lower() not in SKIP_HEADERS and not k.startswith(":")
+        })
+        self.session.cookies.clear()
+        for c in auth.get("cookies", []):
+            self.session.cookies.set(c["name"], c["value"],
+                                     domain=c.get("domain", ""), path=c.get("path", "/"))
+
+    def get(self, path):
+        r = self.session.get(self.base_url + path, timeout=self.timeout)
+        return ApiResponse(r.url, r.status_code, r.content)
+
+    def close(self):
+        self.session.close()
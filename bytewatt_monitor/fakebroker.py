@@ -0,0 +1,168 @@
+# fakebroker.py
+# Minimal in-process MQTT 3.1.1 broker: enough of CONNECT, PUBLISH (QoS 0/1),
+# SUBSCRIBE, PINGREQ and DISCONNECT for paho to talk to it. It records every
+# message it receives and can be stopped and restarted on the same port to
+# simulate broker outages.
+import socket, struct, threading, time
+
+class FakeBroker:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.messages = []        # (monotonic time received, topic, payload bytes, retain)
+        self.retained = {}
+        self.subscribers = []     # (connection, topic filter)
+        self.lock = threading.Lock()
+        self.sock = None
+        self.acceptor = None
+        self.conns = []
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.port = self.sock.getsockname()[1]
+        self.sock.listen(16)
+        self.acceptor = threading.Thread(target=self._accept, args=(self.sock,), daemon=True)
+        self.acceptor.start()
+        return self
+
+    def stop(self):
+        """Close the listener and drop every client connection."""
+        if self.sock:
+            # close() alone leaves accept() blocked on Linux; shutdown() wakes it
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+            self.acceptor.join(2)
+        with self.lock:
+            conns, self.conns, self.subscribers = self.conns, [], []
+        for c in conns:
+            try:
+                c.shutdown(socket.SHUT_RDWR)
+                c.close()
+            except OSError:
+                pass
+
+    def wait_for(self, count, timeout=10):
+        """Block until at least count messages were received; return them."""
+        deadline = time.monotonic() + timeout
+        while len(self.messages) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return list(self.messages)
+
+    def _accept(self, sock):
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.conns.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _read_packet(self, f):
+        head = f.read(1)
+        if not head:
+            return None, None
+        length, shift = 0, 0
+        while True:
+            b = f.read(1)
+            if not b:
+                return None, None
+            length += (b[0] & 0x7F) << shift
+            shift += 7
+            if not b[0] & 0x80:
+                break
+        return head[0], f.read(length)
+
+    def _serve(self, conn):
+        f = conn.makefile("rb")
+        try:
+            while True:
+                ptype, body = self._read_packet(f)
+                if ptype is None:
+                    break
+                kind = ptype >> 4
+                if kind == 1:      # CONNECT
+                    conn.sendall(b"\x20\x02\x00\x00")
+                elif kind == 3:    # PUBLISH
+                    self._on_publish(conn, ptype, body)
+                elif kind == 8:    # SUBSCRIBE
+                    self._on_subscribe(conn, body)
+                elif kind == 12:   # PINGREQ
+                    conn.sendall(b"\xd0\x00")
+                elif kind == 14:   # DISCONNECT
+                    break
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.subscribers = [s for s in self.subscribers if s[0] is not conn]
+                if conn in self.conns:
+                    self.conns.remove(conn)
+            conn.close()
+
+    def _on_publish(self, conn, ptype, body):
+        qos = (ptype >> 1) & 3
+        retain = bool(ptype & 1)
+        tlen = struct.unpack("!H", body[:2])[0]
+        topic = body[2:2 + tlen].decode()
+        pos = 2 + tlen
+        if qos:
+            mid = body[pos:pos + 2]
+            pos += 2
+            conn.sendall(b"\x40\x02" + mid)
+        payload = body[pos:]
+        with self.lock:
+            self.messages.append((time.monotonic(), topic, payload, retain))
+            if retain:
+                self.retained[topic] = payload
+            targets = [c for c, flt in self.subscribers if topic_matches(flt, topic)]
+        for c in targets:
+            self._send_publish(c, topic, payload, False)
+
+    def _on_subscribe(self, conn, body):
+        mid, pos, granted, filters = body[:2], 2, [], []
+        while pos < len(body):
+            flen = struct.unpack("!H", body[pos:pos + 2])[0]
+            filters.append(body[pos + 2:pos + 2 + flen].decode())
+            pos += 2 + flen + 1
+            granted.append(0)
+        with self.lock:
+            self.subscribers += [(conn, flt) for flt in filters]
+            retained = [(t, p) for t, p in self.retained.items()
+                        if any(topic_matches(flt, t) for flt in filters)]
+        conn.sendall(bytes([0x90, 2 + len(granted)]) + mid + bytes(granted))
+        for t, p in retained:
+            self._send_publish(conn, t, p, True)
+
+    def _send_publish(self, conn, topic, payload, retain):
+        t = topic.encode()
+        body = struct.pack("!H", len(t)) + t + payload
+        head = bytes([0x30 | int(retain)]) + encode_length(len(body))
+        try:
+            conn.sendall(head + body)
+        except OSError:
+            pass
+
+def encode_length(n):
+    out = bytearray()
+    while True:
+        b, n = n % 128, n // 128
+        out.append(b | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+def topic_matches(flt, topic):
+    fparts, tparts = flt.split("/"), topic.split("/")
+    for i, fp in enumerate(fparts):
+        if fp == "#":
+            return True
+        if i >= len(tparts) or (fp != "+" and fp != tparts[i]):
+            return False
+    return len(fparts) == len(tparts)
@@ -0,0 +1,209 @@
+# fakecloud.py
+# Local stand-in for monitor.byte-watt.com: a login page plus the three report
+# endpoints, so the add-on can be exercised without the real cloud.
+#
+#   python3 fakecloud.py --port 8080 [--fixtures recorded.json] [--latency 0.2] [--error-rate 0.05]
+#   BYTEWATT_URL=http://127.0.0.1:8080 POLL_MODE=direct python3 run.py
+#
+# A fixtures file maps endpoint paths either to a `data` object, or to a list
+# of complete recorded response bodies that are served in turn.
+#
+# getStaticsByDay honours queryDate=YYYY-MM-DD: the summary is stamped with
+# the day it covers (today when the parameter is absent) and past days get
+# their own figures, so a backfill that ignores the date shows up.
+import argparse, json, random, secrets, threading, time
+from datetime import date
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+LOGIN_PAGE = """<!doctype html>
+<html><body>
+<div id="app">
+  <input placeholder="Please enter username/email" id="u">
+  <input placeholder="Please enter the password" id="p" type="password">
+  <button id="b">Log In</button>
+</div>
+<script>
+document.getElementById("b").onclick = async () => {
+  const r = await fetch("/api/login", {method: "POST", headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({username: document.getElementById("u").value,
+                          password: document.getElementById("p").value})});
+  const j = await r.json();
+  if (j.code !== 200) return;
+  localStorage.setItem("token", j.data.AccessToken);
+  document.getElementById("app").innerHTML = "<h1>Dashboard</h1>";
+  fetch("/api/report/energyStorage/getLastPowerData", {headers: {"Authorization": "Bearer " + j.data.AccessToken}});
+};
+</script>
+</body></html>
+"""
+
+FIXTURES = {
+    "/api/report/energy/getEnergyStatistics": {
+        "epvT": 12450, "eload": 9870, "eout": 3120, "einput": 1450,
+        "echarge": 4200, "edischarge": 3800, "eselfConsumption": 74.9, "eselfSufficiency": 85.3,
+    },
+    "/api/report/energyStorage/getLastPowerData": {
+        "pvPower": 2350, "powerLoad": 780, "batteryPower": -1200, "gridPower": -370, "soc": 64.0,
+    },
+    "/api/report/energy/getStaticsByDay": {
+        "epv": 12.45, "eload": 9.87, "eout": 3.12, "einput": 1.45, "echarge": 4.2, "edischarge": 3.8,
+    },
+}
+
+class FakeCloud:
+    """Threaded HTTP server emulating the ByteWatt cloud."""
+    def __init__(self, host="127.0.0.1", port=0, username="", password="",
+                 fixtures=None, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.username = username
+        self.password = password
+        self.tokens = set()
+        self.fixtures = dict(FIXTURES)
+        self.fixtures.update(fixtures or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.replay_pos = {}
+        self.requests = []    # (monotonic time answered, path)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def expire_sessions(self):
+        """Invalidate every issued token, as the real cloud does on expiry."""
+        self.tokens.clear()
+
+    def body_for(self, path, query=None):
+        """Next response body for an endpoint: fixed data or the next recorded reply."""
+        fixture = self.fixtures[path]
+        if isinstance(fixture, list):
+            with self.lock:
+                i = self.replay_pos.get(path, 0)
+                self.replay_pos[path] = i + 1
+            return fixture[i % len(fixture)]
+        if path.endswith("/getStaticsByDay"):
+            fixture = self.statics_for((query or {}).get("queryDate"), fixture)
+        return {"code": 200, "msg": "Success", "data": fixture}
+
+    def statics_for(self, day, fixture):
+        """The daily summary for a YYYY-MM-DD day, scaled per day and stamped with its date."""
+        today = date.today().isoformat()
+        day = day or today
+        data = dict(fixture)
+        if day != today:
+            scale = 0.5 + date.fromisoformat(day).toordinal() % 10 / 10
+            data = {k: round(v * scale, 2) if isinstance(v, (int, float)) else v for k, v in data.items()}
+        data["queryDate"] = day
+        return data
+
+    def issue_token(self):
+        token = secrets.token_hex(16)
+        self.tokens.add(token)
+        return token
+
+    def _handler(self):
+        cloud = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, ctype="application/json", headers=None):
+                data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _authorized(self):
+                auth = self.headers.get("Authorization", "")
+                if auth.startswith("Bearer ") and auth[7:] in cloud.tokens:
+                    return True
+                for part in self.headers.get("Cookie", "").split(";"):
+                    name, _, value = part.strip().partition("=")
+                    if name == "token" and value in cloud.tokens:
+                        return True
+                return False
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path
+                if path == "/login":
+                    return self._send(200, LOGIN_PAGE, "text/html")
+                if path == "/":
+                    if not self._authorized():
+                        return self._send(302, "", "text/html", {"Location": "/login"})
+                    return self._send(200, "<h1>Dashboard</h1>", "text/html")
+                if path in cloud.fixtures:
+                    with cloud.lock:
+                        cloud.request_count += 1
+                    if cloud.latency or cloud.jitter:
+                        time.sleep(max(0.0, cloud.latency + random.uniform(-cloud.jitter, cloud.jitter)))
+                    if not self._authorized():
+                        return self._send(401, {"code": 401, "msg": "Unauthorized"})
+                    if cloud.error_rate and random.random() < cloud.error_rate:
+                        return self._send(500, {"code": 500, "msg": "Internal Server Error"})
+                    try:
+                        body = cloud.body_for(path, {k: v[0] for k, v in parse_qs(url.query).items()})
+                    except ValueError:
+                        return self._send(400, {"code": 400, "msg": "Bad date"})
+                    with cloud.lock:
+                        cloud.requests.append((time.monotonic(), path))
+                    return self._send(200, body)
+                self._send(404, {"code": 404, "msg": "Not Found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if urlparse(self.path).path != "/api/login":
+                    return self._send(404, {"code": 404, "msg": "Not Found"})
+                if (body.get("username"), body.get("password")) != (cloud.username, cloud.password):
+                    return self._send(200, {"code": 6001, "msg": "Invalid username or password"})
+                token = cloud.issue_token()
+                self._send(200, {"code": 200, "data": {"AccessToken": token}},
+                           headers={"Set-Cookie": f"token={token}; Path=/"})
+
+        return Handler
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local ByteWatt cloud stand-in")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--username", default="")
+    ap.add_argument("--password", default="")
+    ap.add_argument("--fixtures", help="JSON file of recorded responses per endpoint path")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every report call")
+    ap.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of report calls answered 500")
+    args = ap.parse_args()
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    cloud = FakeCloud(args.host, args.port, args.username, args.password,
+                      fixtures, args.latency, args.jitter, args.error_rate)
+    print(f"Fake ByteWatt cloud listening on {cloud.url}")
+    try:
+        cloud.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,148 @@
+# metrics.py
+# Tiny Prometheus-style metrics: counters, gauges and latency histograms with
+# optional labels, a text exposition renderer and a local HTTP endpoint.
+import math, threading, time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30)
+
+REGISTRY = []
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [f"{self.name}{_label_str(self.labels, k)} {v}" for k, v in sorted(self.values.items())]
+
+class Gauge(Metric):
+    """A gauge set directly, or read from fn() (returning {label tuple: value}) at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.values = {}
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def current(self):
+        if self.fn:
+            try:
+                return dict(self.fn())
+            except Exception:
+                return {}
+        with self.lock:
+            return dict(self.values)
+
+    def samples(self):
+        return [f"{self.name}{_label_str(self.labels, k)} {v}" for k, v in sorted(self.current().items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}    # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def mean(self, **labels):
+        s = self.series.get(self._key(labels))
+        return s[-2] / s[-1] if s and s[-1] else 0.0
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, s in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, s):
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    out.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', le)])} {count}")
+                out.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', '+Inf')])} {s[-1]}")
+                out.append(f"{self.name}_sum{_label_str(self.labels, key)} {s[-2]}")
+                out.append(f"{self.name}_count{_label_str(self.labels, key)} {s[-1]}")
+        return out
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+def serve(port, host="127.0.0.1"):
+    """Expose /metrics on a background thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
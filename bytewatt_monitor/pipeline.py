@@ -0,0 +1,166 @@
+# pipeline.py
+# Hands processed samples from the response handlers to a publisher thread
+# through a bounded queue, so a slow broker or spool never holds up the
+# browser's event loop, and slow polling never holds up publishing. Disk
+# bookkeeping (archive, history, rollups) goes to a Recorder thread the same
+# way. When the publish queue is full the overflow policy decides what gives:
+#   drop_oldest  - discard the oldest queued sample (fresh values win)
+#   drop_newest  - discard the incoming sample
+#   block        - wait up to block_timeout for room (None: as long as it
+#                  takes), then drop the newcomer
+import threading, time
+from collections import deque, namedtuple
+import metrics
+
+POLICIES = ("drop_oldest", "drop_newest", "block")
+
+# A processed reading for one system: group is the topic suffix, payload the
+# JSON document and stats the per-field values
+Sample = namedtuple("Sample", "system group payload stats enqueued")
+
+QUEUE_SECONDS = metrics.Histogram("bytewatt_publish_queue_seconds",
+                                  "Time from enqueue to publish completing", ["group"])
+ENQUEUED = metrics.Counter("bytewatt_publish_queue_enqueued_total", "Samples queued for publishing")
+DROPPED  = metrics.Counter("bytewatt_publish_queue_dropped_total", "Samples lost to overflow", ["policy"])
+FAILED   = metrics.Counter("bytewatt_publish_queue_failed_total", "Samples whose publish raised")
+RECORDER_DROPPED = metrics.Counter("bytewatt_recorder_dropped_total", "Bookkeeping calls lost to a full queue")
+QUEUES = []
+metrics.Gauge("bytewatt_publish_queue_depth", "Samples waiting to be published",
+              fn=lambda: {(): sum(len(q.queue) for q in QUEUES)})
+metrics.Gauge("bytewatt_publish_queue_high_water", "Deepest the publish queue has been",
+              fn=lambda: {(): max((q.high_water for q in QUEUES), default=0)})
+
+class PublishQueue:
+    def __init__(self, send, maxsize=1000, policy="drop_oldest", block_timeout=1.0):
+        """send(sample) publishes one Sample; it runs on the worker thread only."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}")
+        self.send = send
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.high_water = 0
+        self.stopping = False
+        self.busy = False
+        self.thread = threading.Thread(target=self._worker, name="publisher", daemon=True)
+        QUEUES.append(self)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, system, group, payload, stats):
+        """Queue a sample; False if the overflow policy dropped it."""
+        sample = Sample(system, group, payload, stats, time.monotonic())
+        with self.cond:
+            if len(self.queue) >= self.maxsize:
+                if self.policy == "drop_oldest":
+                    self.queue.popleft()
+                    DROPPED.inc(policy=self.policy)
+                elif self.policy == "block":
+                    if not self.cond.wait_for(lambda: len(self.queue) < self.maxsize, self.block_timeout):
+                        DROPPED.inc(policy=self.policy)
+                        return False
+                else:
+                    DROPPED.inc(policy=self.policy)
+                    return False
+            self.queue.append(sample)
+            self.high_water = max(self.high_water, len(self.queue))
+            ENQUEUED.inc()
+            self.cond.notify_all()
+        return True
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.queue or self.stopping)
+                if not self.queue:
+                    return
+                sample = self.queue.popleft()
+                self.busy = True
+                # Room for a blocked producer
+                self.cond.notify_all()
+            try:
+                self.send(sample)
+            except Exception as e:
+                FAILED.inc()
+                print(f"Error publishing {sample.group}: {e}")
+            finally:
+                QUEUE_SECONDS.observe(time.monotonic() - sample.enqueued, group=sample.group)
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def drain(self, timeout=5.0):
+        """Wait until everything queued so far has been sent; True if it was."""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.queue and not self.busy, timeout)
+
+    def stop(self, timeout=5.0):
+        """Send what is left (within timeout) and end the worker."""
+        self.drain(timeout)
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+class Recorder:
+    """Runs bookkeeping calls in submission order on one thread.
+
+    A full queue waits up to block_timeout, then drops the call rather than
+    stall the caller; block_timeout None waits for room however long it takes.
+    """
+    def __init__(self, maxsize=1000, block_timeout=1.0):
+        self.maxsize = maxsize
+        self.block_timeout = block_timeout
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.busy = False
+        self.thread = threading.Thread(target=self._worker, name="recorder", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); False if it was dropped."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: len(self.queue) < self.maxsize, self.block_timeout):
+                RECORDER_DROPPED.inc()
+                return False
+            self.queue.append((fn, args))
+            self.cond.notify_all()
+        return True
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.queue or self.stopping)
+                if not self.queue:
+                    return
+                fn, args = self.queue.popleft()
+                self.busy = True
+                self.cond.notify_all()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Error in {getattr(fn, '__name__', fn)}: {e}")
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def drain(self, timeout=5.0):
+        """Wait until everything submitted so far has run; True if it has."""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.queue and not self.busy, timeout)
+
+    def stop(self, timeout=5.0):
+        self.drain(timeout)
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
@@ -0,0 +1,42 @@
+# procstats.py
+# Resident memory of this process and its children (Chromium and its helpers),
+# read straight from /proc so no extra dependency is needed.
+import os
+
+def rss_bytes(pid):
+    """VmRSS of one process in bytes, 0 if it is gone or unreadable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def children(pid):
+    """All descendant pids of pid."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # ppid is the 2nd field after the parenthesised command name
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    out, todo = [], [pid]
+    while todo:
+        for child in parents.get(todo.pop(), []):
+            out.append(child)
+            todo.append(child)
+    return out
+
+def python_rss():
+    return rss_bytes(os.getpid())
+
+def children_rss():
+    """Combined RSS of every process started by us (the Playwright driver and browser)."""
+    return sum(rss_bytes(pid) for pid in children(os.getpid()))
@@ -0,0 +1,193 @@
+# readapi.py
+# Local read API over what the add-on already has in memory: the latest
+# snapshot of each group per system and a ring buffer of recent samples.
+# Payloads are serialized once when they arrive, so a read is a dict lookup
+# and a socket write, and nothing here ever calls the cloud.
+#
+#   GET /api/latest                       every system and group
+#   GET /api/latest/<group>[?system=SN]   one snapshot; ETag / If-None-Match,
+#                                         add &wait=30 to long-poll for a change
+#   GET /api/history/<group>[?system=SN&since=EPOCH&limit=N]
+#   GET /api/events[?group=G&system=SN]   server-sent events, one per update
+import json, os, threading, time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+MAX_WAIT = 60
+HEARTBEAT = 15
+# Versions restart at 1 with the process, so ETags and event ids carry a
+# per-boot nonce: one from before a restart can never match a new version
+BOOT_ID = os.urandom(4).hex()
+
+def etag(version):
+    return f'"{BOOT_ID}-{version}"'
+
+def event_id(version):
+    return f"{BOOT_ID}-{version}"
+
+class Snapshots:
+    def __init__(self, history=720, events=256):
+        self.history_size = history
+        self.cond = threading.Condition()
+        self.version = 0
+        self.latest = {}     # (sn, group) -> (version, ts, body bytes)
+        self.history = {}    # (sn, group) -> deque of (ts, body bytes)
+        self.events = deque(maxlen=events)   # (version, sn, group, body bytes)
+        self.combined = (None, b"{}")         # cache of /api/latest for one version
+
+    def update(self, sn, group, payload, ts=None):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        ts = ts or time.time()
+        with self.cond:
+            self.version += 1
+            key = (sn, group)
+            self.latest[key] = (self.version, ts, body)
+            if key not in self.history:
+                self.history[key] = deque(maxlen=self.history_size)
+            self.history[key].append((ts, body))
+            self.events.append((self.version, sn, group, body))
+            self.cond.notify_all()
+
+    def get(self, sn, group):
+        return self.latest.get((sn, group))
+
+    def all(self):
+        """(version, body) of every latest snapshot as {sn: {group: payload}}."""
+        with self.cond:
+            version, body = self.combined
+            if version == self.version:
+                return version, body
+            systems = {}
+            for (sn, group), (_, _, payload) in sorted(self.latest.items()):
+                systems.setdefault(sn, []).append(b'"%s":%s' % (group.encode(), payload))
+            body = b"{" + b",".join(b'"%s":{%s}' % (sn.encode(), b",".join(parts))
+                                    for sn, parts in systems.items()) + b"}"
+            self.combined = (self.version, body)
+            return self.combined
+
+    def recent(self, sn, group, since=0.0, limit=None):
+        with self.cond:
+            rows = [body for ts, body in self.history.get((sn, group), ()) if ts > since]
+        if limit:
+            rows = rows[-limit:]
+        return b"[" + b",".join(rows) + b"]"
+
+    def wait_change(self, sn, group, version, timeout):
+        """Block until the snapshot moves past version; the new entry or None on timeout."""
+        with self.cond:
+            changed = self.cond.wait_for(
+                lambda: (self.latest.get((sn, group)) or (0,))[0] != version, timeout)
+            return self.latest.get((sn, group)) if changed else None
+
+    def current(self):
+        """The version and every latest snapshot as an event, for a client starting afresh."""
+        with self.cond:
+            return self.version, sorted((v, sn, group, body)
+                                        for (sn, group), (v, _, body) in self.latest.items())
+
+    def events_after(self, version, timeout):
+        """Events newer than version, waiting up to timeout for one."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version > version, timeout)
+            return [e for e in self.events if e[0] > version]
+
+def serve(snapshots, port, default_sn, host="127.0.0.1"):
+    """Run the read API on a background thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_body(self, body, etag=None, status=200, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def not_modified(self, etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            parts = url.path.strip("/").split("/")
+            sn = query.get("system", default_sn)
+            try:
+                if parts == ["api", "latest"]:
+                    version, body = snapshots.all()
+                    tag = etag(version)
+                    if self.headers.get("If-None-Match") == tag:
+                        self.not_modified(tag)
+                    else:
+                        self.send_body(body, tag)
+                elif len(parts) == 3 and parts[:2] == ["api", "latest"]:
+                    self.latest(sn, parts[2], query)
+                elif len(parts) == 3 and parts[:2] == ["api", "history"]:
+                    self.send_body(snapshots.recent(sn, parts[2], float(query.get("since", 0)),
+                                                    int(query.get("limit", 0)) or None))
+                elif parts == ["api", "events"]:
+                    self.events(query.get("group"), query.get("system"))
+                else:
+                    self.send_error(404)
+            except ValueError:
+                self.send_error(400)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def latest(self, sn, group, query):
+            entry = snapshots.get(sn, group)
+            match = self.headers.get("If-None-Match")
+            if entry and match == etag(entry[0]) and "wait" in query:
+                entry = snapshots.wait_change(sn, group, entry[0], min(float(query["wait"]), MAX_WAIT)) or entry
+            if entry is None:
+                self.send_error(404, "No data yet")
+            elif match == etag(entry[0]):
+                self.not_modified(match)
+            else:
+                self.send_body(entry[2], etag(entry[0]))
+
+        def events(self, group, sn):
+            # Parsed before the 200 goes out, so a bad ID still gets a clean 400
+            resume = self.headers.get("Last-Event-ID")
+            last, backlog = snapshots.version, []
+            if resume:
+                boot, _, version = resume.rpartition("-")
+                version = int(version)
+                if boot == BOOT_ID and version <= last:
+                    last = version
+                else:
+                    # An id from before a restart: the versions it counts are
+                    # gone, so catch the client up with the latest snapshots
+                    last, backlog = snapshots.current()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            events = backlog
+            while True:
+                for version, ev_sn, ev_group, body in events:
+                    last = max(last, version)
+                    if (group and ev_group != group) or (sn and ev_sn != sn):
+                        continue
+                    self.wfile.write(b"id: %s\nevent: %s\ndata: {\"system\":\"%s\",\"payload\":%s}\n\n"
+                                     % (event_id(version).encode(), ev_group.encode(), ev_sn.encode(), body))
+                self.wfile.flush()
+                events = snapshots.events_after(last, HEARTBEAT)
+                if not events:
+                    self.wfile.write(b": ping\n\n")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
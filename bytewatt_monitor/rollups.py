@@ -0,0 +1,211 @@
+# rollups.py
+# Local energy accounting from the power samples. Consecutive samples are
+# integrated with the trapezoidal rule (intervals longer than max_gap are
+# counted as gaps, not guessed at) and folded into 1-minute, 15-minute and
+# hourly buckets kept in fixed-size NumPy ring buffers. Day summaries are
+# computed from the buffers in one vectorized pass.
+#
+# Sign convention follows the cloud: battery > 0 is discharging and grid > 0
+# is importing, so each field's energy is split into its positive and
+# negative parts.
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from catalog import POWER_FIELDS
+
+FIELDS = POWER_FIELDS
+
+# name -> (bucket seconds, buckets kept)
+RESOLUTIONS = {
+    "1m":  (60, 2 * 1440),
+    "15m": (900, 8 * 96),
+    "1h":  (3600, 32 * 24),
+}
+
+# Column layout of a bucket row: start, covered seconds, then per field
+START, COVERED = 0, 1
+MIN, MAX, SUM, COUNT, POS, NEG = range(6)
+PER_FIELD = 6
+
+# Published names of the positive/negative energy of each field
+ENERGY_NAMES = {
+    "pv_production": ("pv_kwh", None),
+    "load":          ("load_kwh", None),
+    "battery":       ("battery_discharge_kwh", "battery_charge_kwh"),
+    "grid":          ("grid_import_kwh", "grid_export_kwh"),
+}
+
+WS_PER_KWH = 3.6e6
+
+def signed_energy(pa, pb, dt):
+    """Positive and negative energy (both >= 0) of a linear ramp from pa to pb over dt.
+
+    A ramp that crosses zero is split at the crossing, so e.g. -1000 -> +1000 W
+    is a quarter of dt at each sign, not half at both.
+    """
+    crossing = pa * pb < 0
+    span = np.where(crossing, np.abs(pa - pb), 1.0)
+    pos_a, pos_b = np.maximum(pa, 0), np.maximum(pb, 0)
+    neg_a, neg_b = np.minimum(pa, 0), np.minimum(pb, 0)
+    pos = np.where(crossing, (pos_a ** 2 + pos_b ** 2) / (2 * span), (pos_a + pos_b) / 2) * dt
+    neg = np.where(crossing, (neg_a ** 2 + neg_b ** 2) / (2 * span), -(neg_a + neg_b) / 2) * dt
+    return pos, neg
+
+def day_bounds(day):
+    """Local-time epoch seconds [start, end) of a YYYYMMDD day."""
+    start = datetime.strptime(day, "%Y%m%d")
+    return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+class Ring:
+    """Fixed number of buckets of one width, addressed by bucket start time."""
+
+    def __init__(self, seconds, size, nfields):
+        self.seconds = seconds
+        self.size = size
+        self.rows = np.zeros((size, 2 + PER_FIELD * nfields))
+        self.rows[:, START] = -1
+
+    def row(self, ts):
+        start = ts // self.seconds * self.seconds
+        row = self.rows[int(start // self.seconds) % self.size]
+        if row[START] != start:
+            # Reusing an old slot: start the bucket afresh
+            row[:] = 0
+            row[START] = start
+            row[2 + MIN::PER_FIELD] = np.inf
+            row[2 + MAX::PER_FIELD] = -np.inf
+        return row
+
+    def between(self, start, end):
+        """Rows whose bucket starts in [start, end), oldest first."""
+        rows = self.rows[(self.rows[:, START] >= start) & (self.rows[:, START] < end)]
+        return rows[np.argsort(rows[:, START])]
+
+class Rollups:
+    def __init__(self, fields=FIELDS, max_gap=600):
+        self.fields = fields
+        self.max_gap = max_gap
+        self.lock = threading.Lock()
+        self.rings = {name: Ring(seconds, size, len(fields))
+                      for name, (seconds, size) in RESOLUTIONS.items()}
+        self.last = None        # (ts, power array) of the previous sample
+        self.day = None         # YYYYMMDD the running totals belong to
+        self.pos = np.zeros(len(fields))
+        self.neg = np.zeros(len(fields))
+        self.gap_seconds = 0.0
+
+    def add(self, ts, values):
+        """Fold in one power sample; returns the YYYYMMDD of a day that just ended, or None."""
+        power = np.array([float(values.get(f) or 0) for f in self.fields])
+        with self.lock:
+            day = datetime.fromtimestamp(ts).strftime("%Y%m%d")
+            ended = self.day if self.day and day != self.day else None
+            if ended or not self.day:
+                self.day = day
+                self.pos[:] = 0
+                self.neg[:] = 0
+            for ring in self.rings.values():
+                row = ring.row(ts)
+                row[2 + MIN::PER_FIELD] = np.minimum(row[2 + MIN::PER_FIELD], power)
+                row[2 + MAX::PER_FIELD] = np.maximum(row[2 + MAX::PER_FIELD], power)
+                row[2 + SUM::PER_FIELD] += power
+                row[2 + COUNT::PER_FIELD] += 1
+            if self.last:
+                self._integrate(*self.last, ts, power)
+            self.last = (ts, power)
+            return ended
+
+    def _integrate(self, t0, p0, t1, p1):
+        if t1 <= t0:
+            return
+        if t1 - t0 > self.max_gap:
+            self.gap_seconds += t1 - t0
+            return
+        # Split at minute boundaries so every piece lands in exactly one
+        # bucket of each resolution (and one day)
+        day_start, _ = day_bounds(self.day)
+        t, pa = t0, p0
+        while t < t1:
+            b = min((t // 60 + 1) * 60, t1)
+            pb = p0 + (p1 - p0) * (b - t0) / (t1 - t0)
+            dt = b - t
+            pos, neg = signed_energy(pa, pb, dt)
+            for ring in self.rings.values():
+                row = ring.row(t)
+                row[COVERED] += dt
+                row[2 + POS::PER_FIELD] += pos
+                row[2 + NEG::PER_FIELD] += neg
+            if t >= day_start:
+                self.pos += pos
+                self.neg += neg
+            t, pa = b, pb
+
+    def _energy(self, pos, neg):
+        out = {}
+        for i, field in enumerate(self.fields):
+            pos_name, neg_name = ENERGY_NAMES.get(field, (f"{field}_kwh", None))
+            out[pos_name] = round(float(pos[i]) / WS_PER_KWH, 4)
+            if neg_name:
+                out[neg_name] = round(float(neg[i]) / WS_PER_KWH, 4)
+        return out
+
+    def current(self):
+        """Energy so far today plus the mean power of the current 15-minute bucket."""
+        with self.lock:
+            out = self._energy(self.pos, self.neg)
+            if self.last:
+                row = self.rings["15m"].row(self.last[0])
+                counts = np.maximum(row[2 + COUNT::PER_FIELD], 1)
+                for field, mean in zip(self.fields, row[2 + SUM::PER_FIELD] / counts):
+                    out[f"{field}_mean_15m"] = round(float(mean), 1)
+            return out
+
+    def rollup(self, name, start, end):
+        """Buckets of one resolution starting in [start, end) as dicts, oldest first."""
+        with self.lock:
+            rows = self.rings[name].between(start, end).copy()
+        return [self._bucket(row) for row in rows]
+
+    def _bucket(self, row):
+        counts = row[2 + COUNT::PER_FIELD]
+        bucket = {"start": datetime.fromtimestamp(row[START]).isoformat(),
+                  "covered_seconds": float(row[COVERED])}
+        for i, field in enumerate(self.fields):
+            if counts[i]:
+                bucket[field] = {"min": float(row[2 + i * PER_FIELD + MIN]),
+                                 "max": float(row[2 + i * PER_FIELD + MAX]),
+                                 "mean": round(float(row[2 + i * PER_FIELD + SUM] / counts[i]), 1)}
+        bucket.update(self._energy(row[2 + POS::PER_FIELD], row[2 + NEG::PER_FIELD]))
+        return bucket
+
+    def summary(self, day):
+        """Totals, extremes and profiles of one day from the buffered buckets."""
+        start, end = day_bounds(day)
+        with self.lock:
+            minutes = self.rings["1m"].between(start, end).copy()
+            quarters = self.rings["15m"].between(start, end).copy()
+            hours = self.rings["1h"].between(start, end).copy()
+        if not len(minutes):
+            return None
+        counts = minutes[:, 2 + COUNT::PER_FIELD].sum(axis=0)
+        q_counts = quarters[:, 2 + COUNT::PER_FIELD]
+        q_means = np.where(q_counts > 0, quarters[:, 2 + SUM::PER_FIELD] / np.maximum(q_counts, 1), -np.inf)
+        peaks = q_means.max(axis=0) if len(quarters) else np.full(len(self.fields), -np.inf)
+        out = {
+            "day": day,
+            "coverage": round(float(minutes[:, COVERED].sum()) / (end - start), 4),
+            "samples": int(counts.max()),
+            "energy": self._energy(minutes[:, 2 + POS::PER_FIELD].sum(axis=0),
+                                   minutes[:, 2 + NEG::PER_FIELD].sum(axis=0)),
+        }
+        mins = minutes[:, 2 + MIN::PER_FIELD].min(axis=0)
+        maxs = minutes[:, 2 + MAX::PER_FIELD].max(axis=0)
+        means = minutes[:, 2 + SUM::PER_FIELD].sum(axis=0) / np.maximum(counts, 1)
+        out["power"] = {
+            field: {"min": float(mins[i]), "max": float(maxs[i]), "mean": round(float(means[i]), 1),
+                    "peak_15m_mean": None if np.isinf(peaks[i]) else round(float(peaks[i]), 1)}
+            for i, field in enumerate(self.fields) if counts[i]
+        }
+        out["hourly"] = [self._bucket(row) for row in hours]
+        out["quarter_hourly"] = [self._bucket(row) for row in quarters]
+        return out
@@ -1,8 +1,26 @@
-# Paste your converte# run.py
-from playwright.sync_api import sync_playwright
+# run.py
+import time
+STARTED = time.monotonic()   # before the heavier imports, for the startup report
 from datetime import datetime, timedelta
-import time, json, os, sys, schedule, threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+import json, os, sys, threading
 import paho.mqtt.client as mqtt
+from scheduler import Scheduler, parse_hhmm
+from tsstore import TimeSeriesStore
+from deadband import FieldPublisher
+from spool import Spool, SpooledClient, PUBLISH_SECONDS
+import procstats, metrics, readapi
+from adaptive import AdaptiveInterval, parse_hours
+from backfill import Backfill, fetch_statics_for_day
+from watchdog import Watchdog
+from archive import ResponseArchive, parse_time
+from pipeline import PublishQueue, Recorder, POLICIES, QUEUE_SECONDS, DROPPED
+from rollups import Rollups, day_bounds
+from direct import ApiResponse, RequestTimeout
+from correlate import RequestTracker, REQUEST_SECONDS, TIMEOUTS, STALE
+from startup import StartupTimer
+from catalog import CATALOG, GROUP_KEYS, extract, diff_configs, fields as catalog_fields
 
 # ─── Configuration from environment ─────────────────────────────────────────────
 MQTT_BROKER       = os.getenv("MQTT_BROKER", "localhost")
@@ -11,53 +29,428 @@ MQTT_TOPIC_PREFIX = os.getenv("MQTT_TOPIC_PREFIX", "bytewatt")
 MQTT_CLIENT_ID    = os.getenv("MQTT_CLIENT_ID", "homeassistant")
 MQTT_USERNAME     = os.getenv("MQTT_USERNAME", "")
 MQTT_PASSWORD     = os.getenv("MQTT_PASSWORD", "")
+# Messages published while the broker is unreachable are kept here, up to the cap
+SPOOL_DIR         = os.getenv("SPOOL_DIR", "/data/mqtt_spool")
+SPOOL_MAX_MB      = float(os.getenv("SPOOL_MAX_MB", "50"))
 SYS_SN            = os.getenv("SYS_SN", "")
 STATION_ID        = os.getenv("STATION_ID", "")
+BYTEWATT_URL      = os.getenv("BYTEWATT_URL", "https://monitor.byte-watt.com")
+BYTEWATT_USERNAME = os.getenv("BYTEWATT_USERNAME", "")
+BYTEWATT_PASSWORD = os.getenv("BYTEWATT_PASSWORD", "")
+# "browser": poll through headless Chromium; "direct": browser only for login;
+# "replay": feed archived responses back through the handlers, no polling
+POLL_MODE         = os.getenv("POLL_MODE", "browser")
+# A replay publishes history, not current state: unless REPLAY_LIVE opts in,
+# it goes out non-retained under its own topic prefix, without discovery, so
+# Home Assistant's entities and statistics never see it
+REPLAY_LIVE       = os.getenv("REPLAY_LIVE", "false").lower() == "true"
+REPLAY_ISOLATED   = POLL_MODE == "replay" and not REPLAY_LIVE
+if REPLAY_ISOLATED:
+    MQTT_TOPIC_PREFIX = os.getenv("REPLAY_TOPIC_PREFIX") or f"{MQTT_TOPIC_PREFIX}/replay"
+RETAIN            = not REPLAY_ISOLATED
+# Captured login (headers, cookies, browser storage state), reused across restarts
+SESSION_FILE      = os.getenv("SESSION_FILE", "/data/session.json")
+# Hashes of the discovery configs last published, so unchanged ones are skipped;
+# kept per broker and discovery prefix, so a different target gets every config
+DISCOVERY_CACHE   = os.getenv("DISCOVERY_CACHE", "/data/discovery_hashes.json")
+# Response `code` values the cloud uses for a missing or expired login
+AUTH_ERROR_CODES  = {401, 403}
+# Optional blind page reload in browser mode (0 = only re-login when rejected)
+RELOAD_MINUTES    = float(os.getenv("RELOAD_MINUTES", "0"))
+# Lean browser: only the login flow and our report calls are let through,
+# and Chromium runs with a single renderer and memory-saving flags
+LEAN_BROWSER      = os.getenv("LEAN_BROWSER", "true").lower() == "true"
+# Log the browser's traffic and memory every power interval (always exported as metrics)
+TRAFFIC_REPORT    = os.getenv("TRAFFIC_REPORT", "false").lower() == "true"
+# Prometheus-style /metrics endpoint (0 = off) and the address it binds to
+# (0.0.0.0 to let a scraper on another host in), and optional MQTT diagnostic sensors
+METRICS_PORT      = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST      = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_MQTT      = os.getenv("METRICS_MQTT", "false").lower() == "true"
+CHROMIUM_LEAN_ARGS = [
+    "--no-zygote",
+    "--renderer-process-limit=1",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--js-flags=--max-old-space-size=64",
+]
+# Upper bound on systems fetched at the same time in direct mode
+MAX_CONCURRENCY   = int(os.getenv("MAX_CONCURRENCY", "4"))
+# Seconds between polls of each endpoint, random delay added to each poll,
+# and what to do about ticks missed while the loop was busy ("skip"/"catchup")
+POLL_INTERVALS    = {
+    "power":   float(os.getenv("POLL_INTERVAL_POWER", "30")),
+    "energy":  float(os.getenv("POLL_INTERVAL_ENERGY", "60")),
+    "statics": float(os.getenv("POLL_INTERVAL_STATICS", "900")),
+}
+POLL_JITTER       = float(os.getenv("POLL_JITTER", "0"))
+SCHEDULE_POLICY   = os.getenv("SCHEDULE_POLICY", "skip")
+# Adaptive power polling: faster while readings swing, slower while idle or in
+# quiet hours, backing off on errors; bounds in seconds, deltas in W
+ADAPTIVE_POLLING  = os.getenv("ADAPTIVE_POLLING", "false").lower() == "true"
+ADAPTIVE_MIN      = float(os.getenv("ADAPTIVE_MIN", "10"))
+ADAPTIVE_MAX      = float(os.getenv("ADAPTIVE_MAX", "300"))
+ADAPTIVE_FAST_DELTA = float(os.getenv("ADAPTIVE_FAST_DELTA", "300"))
+ADAPTIVE_SLOW_DELTA = float(os.getenv("ADAPTIVE_SLOW_DELTA", "50"))
+ADAPTIVE_QUIET_HOURS = os.getenv("ADAPTIVE_QUIET_HOURS", "23-6")
+# Ceiling of the error/rate-limit backoff; may sit above ADAPTIVE_MAX, which
+# bounds the interval chosen from the readings
+ADAPTIVE_MAX_BACKOFF = float(os.getenv("ADAPTIVE_MAX_BACKOFF", "900"))
+# "json": one retained JSON blob per poll; "fields": one topic per metric,
+# sent only when it moves past its deadband or max_age runs out
+PUBLISH_MODE      = os.getenv("PUBLISH_MODE", "json")
+DEADBAND_ABS      = float(os.getenv("DEADBAND_ABS", "0"))
+DEADBAND_REL      = float(os.getenv("DEADBAND_REL", "0"))
+PUBLISH_MAX_AGE   = float(os.getenv("PUBLISH_MAX_AGE", "300"))   # 0 = no heartbeat
+PUBLISH_BATCH_SECS = float(os.getenv("PUBLISH_BATCH_SECONDS", "0"))
+
+def load_systems():
+    """Systems to poll: the `systems` option list, else the single SYS_SN/STATION_ID pair.
+
+    A lone legacy system keeps the original un-namespaced topics and entity ids;
+    listed systems get `<prefix>/<sn>/...` topics and `bytewatt_<sn>_...` ids.
+    """
+    raw = os.getenv("SYSTEMS", "")
+    try:
+        listed = json.loads(raw) if raw else []
+    except ValueError as e:
+        print(f"Ignoring malformed SYSTEMS option: {e}")
+        listed = []
+    if not listed:
+        return [{"sys_sn": SYS_SN, "station_id": STATION_ID, "name": "ByteWatt",
+                 "key": "", "topic": MQTT_TOPIC_PREFIX, "uid": "bytewatt"}]
+    systems = []
+    for entry in listed:
+        sn = entry["system_sn"]
+        systems.append({
+            "sys_sn":     sn,
+            "station_id": entry.get("station_id", ""),
+            "name":       entry.get("name") or sn,
+            "key":        sn,
+            "topic":      f"{MQTT_TOPIC_PREFIX}/{sn}",
+            "uid":        f"bytewatt_{sn.lower()}",
+        })
+    return systems
+
+SYSTEMS = load_systems()
+
+def load_deadbands():
+    """Per-field deadband overrides from the `deadbands` option list."""
+    raw = os.getenv("DEADBANDS", "")
+    try:
+        entries = json.loads(raw) if raw else []
+    except ValueError as e:
+        print(f"Ignoring malformed DEADBANDS option: {e}")
+        entries = []
+    return {e["field"]: {k: float(e[k]) for k in ("abs", "rel") if e.get(k) is not None}
+            for e in entries}
+
+adaptive = AdaptiveInterval(POLL_INTERVALS["power"], ADAPTIVE_MIN, ADAPTIVE_MAX,
+                            ADAPTIVE_FAST_DELTA, ADAPTIVE_SLOW_DELTA,
+                            quiet_hours=parse_hours(ADAPTIVE_QUIET_HOURS),
+                            max_backoff_s=ADAPTIVE_MAX_BACKOFF) if ADAPTIVE_POLLING else None
+
+field_publisher = FieldPublisher(DEADBAND_ABS, DEADBAND_REL, PUBLISH_MAX_AGE,
+                                 load_deadbands(), PUBLISH_BATCH_SECS, retain=RETAIN)
 
 # Directory for local JSON dumps
-DATA_DIR = "/data/power_data"
+DATA_DIR = os.getenv("DATA_DIR", "/data/power_data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Catch-up of missed daily summaries: how many days back, parallel requests,
+# and the query parameter getStaticsByDay takes the date in
+BACKFILL_DAYS        = int(os.getenv("BACKFILL_DAYS", "14"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "2"))
+STATICS_DATE_PARAM   = os.getenv("STATICS_DATE_PARAM", "queryDate")
+
+# Samples waiting for the publisher thread, and what to do when it falls behind
+PUBLISH_QUEUE_SIZE = int(os.getenv("PUBLISH_QUEUE_SIZE", "1000"))
+PUBLISH_OVERFLOW   = os.getenv("PUBLISH_OVERFLOW", "drop_oldest")
+if PUBLISH_OVERFLOW not in POLICIES:
+    print(f"Unknown PUBLISH_OVERFLOW {PUBLISH_OVERFLOW!r}, using drop_oldest")
+    PUBLISH_OVERFLOW = "drop_oldest"
+
+# Raw response archive, and the window/speed (1 = as recorded, 0 = flat out)
+# POLL_MODE=replay plays it back at
+ARCHIVE      = os.getenv("ARCHIVE", "true").lower() != "false"
+ARCHIVE_DAYS = int(os.getenv("ARCHIVE_DAYS", "30"))
+REPLAY_FROM  = os.getenv("REPLAY_FROM", "")
+REPLAY_TO    = os.getenv("REPLAY_TO", "")
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "0"))
+
+# Optional local HTTP read API (0 = off), the address it binds to (0.0.0.0
+# to serve other hosts) and samples it keeps per group
+READ_API_PORT    = int(os.getenv("READ_API_PORT", "0"))
+READ_API_HOST    = os.getenv("READ_API_HOST", "127.0.0.1")
+READ_API_HISTORY = int(os.getenv("READ_API_HISTORY", "720"))
+
+# Watchdog: recycle the page/context (or HTTP session), and re-exec only as
+# a last resort, when memory, staleness or the error rate cross these
+# thresholds (0 disables one)
+WATCHDOG               = os.getenv("WATCHDOG", "true").lower() != "false"
+WATCHDOG_INTERVAL      = float(os.getenv("WATCHDOG_INTERVAL", "60"))
+WATCHDOG_BROWSER_MB    = int(os.getenv("WATCHDOG_BROWSER_MB", "600"))
+WATCHDOG_PYTHON_MB     = int(os.getenv("WATCHDOG_PYTHON_MB", "400"))
+WATCHDOG_STALE_SECONDS = float(os.getenv("WATCHDOG_STALE_SECONDS", "600"))
+WATCHDOG_ERROR_RATE    = float(os.getenv("WATCHDOG_ERROR_RATE", "0.5"))
+
+# Per-request deadline in seconds and how many requests each (system,
+# endpoint) may have outstanding; a hung call then cannot pile up more
+REQUEST_TIMEOUT       = float(os.getenv("REQUEST_TIMEOUT", "10"))
+REQUEST_MAX_IN_FLIGHT = int(os.getenv("REQUEST_MAX_IN_FLIGHT", "1"))
+
+# Local energy integration of the power samples; samples further apart than
+# ENERGY_MAX_GAP seconds are treated as a gap rather than interpolated
+LOCAL_ENERGY   = os.getenv("LOCAL_ENERGY", "true").lower() != "false"
+ENERGY_MAX_GAP = float(os.getenv("ENERGY_MAX_GAP", "600"))
+
+# Binary sample history: days kept at full resolution, bucket size they are
+# then averaged down to, and days kept at all
+TS_RAW_DAYS       = int(os.getenv("TS_RAW_DAYS", "7"))
+TS_COMPACT_SECS   = int(os.getenv("TS_COMPACT_SECONDS", "60"))
+TS_RETENTION_DAYS = int(os.getenv("TS_RETENTION_DAYS", "365"))
+# Every field the catalog reads for a group is kept in its history
+SERIES_FIELDS = {"power": catalog_fields("power_data"), "energy": catalog_fields("energy_stats")}
+ts_store = TimeSeriesStore(os.path.join(DATA_DIR, "tsdb"), SERIES_FIELDS,
+                           raw_days=TS_RAW_DAYS, compact_seconds=TS_COMPACT_SECS,
+                           retention_days=TS_RETENTION_DAYS)
+
+archive = ResponseArchive(os.path.join(DATA_DIR, "archive"), retention_days=ARCHIVE_DAYS)
+
+# Latest snapshot and recent samples per system and group, for the read API
+snapshots = readapi.Snapshots(history=READ_API_HISTORY)
+
+# Energy rollups per system key; samples arriving before the startup seeding
+# has replayed the stored history are held back until it has
+rollups = {s["key"]: Rollups(max_gap=ENERGY_MAX_GAP) for s in SYSTEMS} if LOCAL_ENERGY else {}
+rollups_ready = threading.Event()
+early_power = []
+early_lock = threading.Lock()
+
+startup = StartupTimer(t0=STARTED)
+
+# ─── Metrics ───────────────────────────────────────────────────────────────────
+POLL_SECONDS    = metrics.Histogram("bytewatt_poll_seconds", "Time to issue one scheduled poll", ["endpoint"])
+HANDLER_SECONDS = metrics.Histogram("bytewatt_handler_seconds", "Time spent in a response handler", ["handler"])
+DECODE_SECONDS  = metrics.Histogram("bytewatt_json_decode_seconds", "Time to decode a response body")
+LOGIN_SECONDS   = metrics.Histogram("bytewatt_login_seconds", "Duration of a browser login",
+                                    buckets=(1, 2, 5, 10, 15, 20, 30, 60))
+RELOAD_SECONDS  = metrics.Histogram("bytewatt_reload_seconds", "Duration of a page reload",
+                                    buckets=(0.5, 1, 2, 5, 10, 30))
+RESPONSES       = metrics.Counter("bytewatt_responses_total", "API responses handled", ["handler"])
+HANDLER_ERRORS  = metrics.Counter("bytewatt_handler_errors_total", "Responses whose handler failed", ["handler"])
+AUTH_FAILURES   = metrics.Counter("bytewatt_auth_failures_total", "Responses rejecting our session")
+BROWSER_REQUESTS = metrics.Counter("bytewatt_browser_requests_total", "Requests the browser completed")
+BROWSER_BYTES   = metrics.Counter("bytewatt_browser_bytes_total", "Headers and bodies the browser sent and received")
+BROWSER_BLOCKED = metrics.Counter("bytewatt_browser_blocked_total", "Browser requests aborted by the lean profile")
+metrics.Gauge("bytewatt_missed_ticks", "Scheduler ticks skipped or caught up, per job", ["job"],
+              fn=lambda: {(j.name,): j.missed for j in (active_scheduler.jobs if active_scheduler else [])})
+metrics.Gauge("bytewatt_poll_interval_seconds", "Current interval of each poll job", ["endpoint"],
+              fn=lambda: {(j.name[5:],): j.interval for j in (active_scheduler.jobs if active_scheduler else [])
+                          if j.name.startswith("poll_")})
+metrics.Gauge("bytewatt_rss_bytes", "Resident memory", ["process"],
+              fn=lambda: {("python",): procstats.python_rss(), ("browser",): procstats.children_rss()})
+
 # ─── Scheduler for periodic restarts ────────────────────────────────────────────
 def restart():
     """Re-executes this script in-place."""
+    # Nothing buffered in memory survives the exec
+    if recorder:
+        recorder.drain()
+    if publish_queue:
+        publish_queue.drain()
+    archive.flush()
+    ts_store.close()
     os.execv(sys.executable, [sys.executable] + sys.argv)
 
-# Restart at 02:00, 04:00, 13:00, and 22:00 each day
-for t in ["02:00", "04:00", "13:00", "22:00"]:
-    schedule.every().day.at(t).do(restart)
+# Optional fixed daily restarts, e.g. "02:00,13:00". Off by default: the
+# session is persisted and re-established only when the cloud rejects it.
+def parse_restart_times(value):
+    """The valid HH:MM entries of a comma-separated list; the rest are reported and skipped."""
+    times = []
+    for t in filter(None, (t.strip() for t in value.split(","))):
+        try:
+            parse_hhmm(t)
+        except ValueError as e:
+            print(f"Ignoring restart time: {e}")
+            continue
+        times.append(t)
+    return times
+
+RESTART_TIMES = parse_restart_times(os.getenv("RESTART_TIMES", ""))
 
-def run_scheduler():
-    """Run schedule in background."""
-    threading.Thread(
-        target=lambda: [schedule.run_pending() or time.sleep(1) for _ in iter(int, 1)],
-        daemon=True
-    ).start()
+active_scheduler = None
+
+def timed_poll(poll, endpoint):
+    startup.mark("first_poll")
+    with POLL_SECONDS.time(endpoint=endpoint):
+        poll([endpoint])
+
+def retune_intervals(jobs, mqtt_client):
+    """Apply the adaptive controller's decision to the poll jobs after a power poll."""
+    old = jobs["power"].interval
+    jobs["power"].interval = adaptive.next_interval()
+    # Errors and rate limits slow every endpoint, not just power
+    factor = min(adaptive.backoff_factor(), 8)
+    for endpoint, job in jobs.items():
+        if endpoint != "power":
+            job.interval = POLL_INTERVALS[endpoint] * factor
+    if jobs["power"].interval != old:
+        publish_poll_interval(mqtt_client, jobs["power"].interval)
+
+def publish_poll_interval(mqtt_client, seconds):
+    mqtt_client.publish(f"{MQTT_TOPIC_PREFIX}/diagnostics/poll_interval", f"{seconds:g}", retain=True)
+
+def build_scheduler(poll, mqtt_client):
+    """Scheduler with one job per endpoint calling poll(endpoint), plus the daily jobs."""
+    global active_scheduler
+    sched = active_scheduler = Scheduler()
+    jobs = {}
+    for endpoint, interval in POLL_INTERVALS.items():
+        if adaptive and endpoint == "power":
+            fn = lambda: (timed_poll(poll, "power"), retune_intervals(jobs, mqtt_client))
+        else:
+            fn = lambda e=endpoint: timed_poll(poll, e)
+        jobs[endpoint] = sched.every(interval, fn, name=f"poll_{endpoint}",
+                                     jitter=POLL_JITTER, policy=SCHEDULE_POLICY, run_now=True)
+    if adaptive:
+        # The entity would stay unknown until the interval first changes
+        publish_poll_interval(mqtt_client, jobs["power"].interval)
+    if METRICS_MQTT:
+        sched.every(60, lambda: publish_diagnostics(mqtt_client), name="diagnostics")
+    if PUBLISH_MODE == "fields" and PUBLISH_BATCH_SECS:
+        sched.every(PUBLISH_BATCH_SECS, lambda: field_publisher.flush(mqtt_client), name="publish_batch")
+    # Save daily summary at 23:56, from a statics poll made just before rather
+    # than one up to POLL_INTERVAL_STATICS old
+    sched.daily_at("23:55", lambda: timed_poll(poll, "statics"), name="statics_before_summary")
+    sched.daily_at("23:56", lambda: save_daily_summary(datetime.now()), name="daily_summary")
+    sched.daily_at("00:05", ts_store.start_compact, name="ts_compact")
+    if ARCHIVE:
+        sched.every(60, archive.flush, name="archive_flush")
+        sched.daily_at("00:05", archive.prune, name="archive_prune")
+    for t in RESTART_TIMES:
+        sched.daily_at(t, restart)
+    return sched
+
+# ─── Watchdog ──────────────────────────────────────────────────────────────────
+watchdog = Watchdog(["page", "context", "restart"] if POLL_MODE == "browser" else ["session", "restart"],
+                    browser_mb=WATCHDOG_BROWSER_MB, python_mb=WATCHDOG_PYTHON_MB,
+                    stale_s=WATCHDOG_STALE_SECONDS, error_rate=WATCHDOG_ERROR_RATE,
+                    grace_s=2 * WATCHDOG_INTERVAL)
+
+def run_watchdog(recycle):
+    """Check the thresholds and, if one is crossed, call recycle(action) and log the outcome."""
+    # Judge staleness against the power poll as currently (maybe backed off) scheduled
+    polls = [j.interval for j in (active_scheduler.jobs if active_scheduler else []) if j.name == "poll_power"]
+    found = watchdog.check(procstats.children_rss(), procstats.python_rss(),
+                           sum(RESPONSES.values.values()), sum(HANDLER_ERRORS.values.values()),
+                           interval=max(polls, default=0))
+    if not found:
+        return
+    action, reason = found
+    print(f"Watchdog: {reason}; recycling {action}...")
+    if action == "restart":
+        restart()
+    start = time.monotonic()
+    try:
+        ok = recycle(action)
+    except Exception as e:
+        print(f"Watchdog: {action} recycle raised {e}")
+        ok = False
+    took = time.monotonic() - start
+    watchdog.recycled(action, took)
+    print(f"Watchdog: {action} recycled in {took:.1f}s" if ok else
+          f"Watchdog: {action} recycle failed after {took:.1f}s, escalating if it persists")
 
 # ─── MQTT Setup ─────────────────────────────────────────────────────────────────
 def on_mqtt_connect(client, userdata, flags, rc):
     if rc == 0:
         print("Connected to MQTT Broker!")
+        startup.end("mqtt_connect")
+        # Home Assistant announces restarts here; it may have lost the configs
+        if not REPLAY_ISOLATED:
+            client.subscribe(HA_STATUS_TOPIC)
+        # userdata is the SpooledClient: replay whatever piled up while offline
+        userdata.resume()
     else:
         print(f"Failed to connect, return code {rc}")
 
+HA_STATUS_TOPIC = "homeassistant/status"
+
+def on_mqtt_message(client, userdata, msg):
+    if msg.topic == HA_STATUS_TOPIC and msg.payload == b"online":
+        print("Home Assistant restarted, republishing discovery")
+        threading.Thread(target=publish_discovery_messages, args=(userdata, True), daemon=True).start()
+
+def on_mqtt_disconnect(client, userdata, rc):
+    if rc != 0:
+        print(f"Lost connection to MQTT broker (rc {rc}), spooling until it is back")
+
 def setup_mqtt():
+    """Connect in the background; until the broker answers, publishes go to the spool."""
     client = mqtt.Client(MQTT_CLIENT_ID)
+    spooled = SpooledClient(client, Spool(SPOOL_DIR, max_bytes=int(SPOOL_MAX_MB * 1024 * 1024)))
+    client.user_data_set(spooled)
     client.on_connect = on_mqtt_connect
+    client.on_disconnect = on_mqtt_disconnect
+    client.on_message = on_mqtt_message
     if MQTT_USERNAME:
         client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+    client.reconnect_delay_set(min_delay=1, max_delay=60)
+    startup.begin("mqtt_connect")
     try:
-        client.connect(MQTT_BROKER, MQTT_PORT)
+        client.connect_async(MQTT_BROKER, MQTT_PORT)
     except Exception as e:
         print("Error connecting to MQTT broker:", e)
         return None
     client.loop_start()
-    publish_discovery_messages(client)
-    return client
+    # Discovery goes out (or into the spool) while the browser starts
+    if not REPLAY_ISOLATED:
+        threading.Thread(target=timed_discovery, args=(spooled,), daemon=True).start()
+    return spooled
+
+def timed_discovery(client):
+    with startup.phase("discovery"):
+        publish_discovery_messages(client)
+
+# ─── Session Persistence ────────────────────────────────────────────────────────
+def load_session():
+    """Previously captured login, or None."""
+    try:
+        with open(SESSION_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_session(auth):
+    """Persist a captured login; readable only by us since it holds tokens."""
+    try:
+        tmp = SESSION_FILE + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(dict(auth, saved_at=datetime.now().isoformat()), f)
+        os.replace(tmp, SESSION_FILE)
+    except Exception as e:
+        print(f"Error saving session: {e}")
+
+def is_auth_error(resp):
+    """True if an API response says our login is no longer valid."""
+    if resp.status in AUTH_ERROR_CODES:
+        return True
+    try:
+        return resp.json().get("code") in AUTH_ERROR_CODES
+    except Exception:
+        return False
 
 # ─── Helpers ───────────────────────────────────────────────────────────────────
-def save_data_locally(data, basename):
-    date_str = datetime.now().strftime("%Y%m%d")
+def save_data_locally(data, basename, date_str=None):
+    date_str = date_str or datetime.now().strftime("%Y%m%d")
     filename = f"{basename}_{date_str}.json"
     path = os.path.join(DATA_DIR, filename)
     try:
@@ -67,10 +460,144 @@ def save_data_locally(data, basename):
     except Exception as e:
         print(f"Error saving {basename} data locally: {e}")
 
+def record_sample(kind, system, now, values):
+    """Append a processed sample to the binary history."""
+    if POLL_MODE == "replay":
+        # Replayed samples carry today's time; keep them out of the history
+        return
+    try:
+        ts_store.append(kind, values, now.timestamp(), key=system["key"])
+    except Exception as e:
+        print(f"Error recording {kind} sample: {e}")
+
+def rollup_basename(system):
+    return "energy_rollup" if not system["key"] else f"energy_rollup_{system['key']}"
+
+def save_energy_rollup(system, day):
+    summary = rollups[system["key"]].summary(day)
+    if summary:
+        save_data_locally(summary, rollup_basename(system), day)
+
+def track_energy(mqtt_client, system, now, stats):
+    """Integrate a power sample and publish today's local energy figures."""
+    r = rollups.get(system["key"])
+    if r is None or POLL_MODE == "replay":
+        # Replayed samples carry today's time; keep them out of today's energy
+        return
+    with early_lock:
+        # Live samples must not land before the stored history is replayed
+        early_power.append((system, now, stats))
+        if not rollups_ready.is_set():
+            return
+        held = early_power[:]
+        del early_power[:]
+    for sample_system, sample_time, values in held:
+        sample_rollups = rollups[sample_system["key"]]
+        ts = sample_time.timestamp()
+        # A sample stored before seeding read the history was replayed already
+        if sample_rollups.last is not None and ts <= sample_rollups.last[0]:
+            continue
+        ended = sample_rollups.add(ts, values)
+        if ended:
+            save_energy_rollup(sample_system, ended)
+    energy = r.current()
+    publish_stats(mqtt_client, system, "local_energy",
+                  {"timestamp": now.isoformat(), "local_energy": energy}, energy)
+
+def housekeeping():
+    """Startup maintenance that can run alongside the browser start."""
+    try:
+        with startup.phase("housekeeping"):
+            try:
+                seed_rollups()
+            finally:
+                # Samples held back meanwhile are folded in with the next one
+                rollups_ready.set()
+            # Compaction is slow on a large history and nothing waits for it
+            ts_store.compact()
+    except Exception as e:
+        print(f"Error during startup housekeeping: {e}")
+
+def seed_rollups():
+    """Rebuild the rollups from the stored power history of yesterday and today.
+
+    Keeps today's totals across restarts and writes yesterday's summary if the
+    add-on was down when the day ended.
+    """
+    if not rollups or POLL_MODE == "replay":
+        return
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
+    start, _ = day_bounds(yesterday)
+    for system in SYSTEMS:
+        r = rollups[system["key"]]
+        for sample in ts_store.query("power", start, time.time(), key=system["key"]):
+            r.add(sample["timestamp"], sample)
+        path = os.path.join(DATA_DIR, f"{rollup_basename(system)}_{yesterday}.json")
+        if not os.path.exists(path):
+            save_energy_rollup(system, yesterday)
+
+# ─── Browser ───────────────────────────────────────────────────────────────────
+# Network use of the browser since the last report
+traffic = {"requests": 0, "bytes": 0, "blocked": 0}
+
+def launch_browser(p):
+    if LEAN_BROWSER:
+        return p.chromium.launch(headless=True, args=CHROMIUM_LEAN_ARGS)
+    return p.chromium.launch(headless=True)
+
+def lean_route(route):
+    """Let through only what the login flow and our polling need."""
+    req = route.request
+    path = urlparse(req.url).path
+    same_origin = req.url.startswith(BYTEWATT_URL)
+    # Scripts may come from a CDN; any other third-party request is analytics or assets
+    if req.resource_type in ("image", "font", "stylesheet", "media", "manifest") or \
+            (not same_origin and req.resource_type != "script"):
+        traffic["blocked"] += 1
+        BROWSER_BLOCKED.inc()
+        return route.abort()
+    # The dashboard's own report polling is dropped; ours carries the cycle tag
+    if path.startswith("/api/report/") and poll_seq(req.headers) is None:
+        traffic["blocked"] += 1
+        BROWSER_BLOCKED.inc()
+        return route.abort()
+    route.continue_()
+
+def count_traffic(req):
+    try:
+        sizes = req.sizes()
+    except Exception:
+        return
+    size = sum(sizes.get(k, 0) for k in (
+        "requestHeadersSize", "requestBodySize", "responseHeadersSize", "responseBodySize"))
+    traffic["requests"] += 1
+    traffic["bytes"] += size
+    BROWSER_REQUESTS.inc()
+    BROWSER_BYTES.inc(size)
+
+def new_browser_context(browser, **kwargs):
+    """Browser context with request routing (lean mode) and traffic accounting."""
+    context = browser.new_context(**kwargs)
+    if LEAN_BROWSER:
+        context.route("**/*", lean_route)
+    context.on("requestfinished", count_traffic)
+    return context
+
+def report_traffic():
+    """Print and reset the per-cycle browser traffic, with current memory use."""
+    print(f"Browser cycle: {traffic['requests']} requests, {traffic['bytes'] / 1024:.1f} KB, "
+          f"{traffic['blocked']} blocked; RSS browser {procstats.children_rss() / 2**20:.0f} MB, "
+          f"python {procstats.python_rss() / 2**20:.0f} MB")
+    traffic.update(requests=0, bytes=0, blocked=0)
+
 # ─── Page Login & API Triggers ──────────────────────────────────────────────────
 def login_by_labels(page, url, username, password):
-    page.goto(url)
+    with LOGIN_SECONDS.time():
+        return _login_by_labels(page, url, username, password)
+
+def _login_by_labels(page, url, username, password):
     try:
+        page.goto(url)
         page.locator('input[placeholder="Please enter username/email"]').fill(username)
         page.locator('input[placeholder="Please enter the password"]').fill(password)
         page.locator('button:has-text("Log In")').click()
@@ -81,193 +608,682 @@ def login_by_labels(page, url, username, password):
         print("Login error:", e)
         return False
 
-def trigger_api_requests(page):
-    # Construct URLs
-    energy_url = f"/api/report/energy/getEnergyStatistics?sysSn={SYS_SN}&stationId={STATION_ID}"
-    power_url  = f"/api/report/energyStorage/getLastPowerData?sysSn={SYS_SN}&stationId={STATION_ID}"
-    stats_url  = f"/api/report/energy/getStaticsByDay?sysSn={SYS_SN}&stationId={STATION_ID}"
+ENDPOINTS = {
+    "energy":  "/api/report/energy/getEnergyStatistics",
+    "power":   "/api/report/energyStorage/getLastPowerData",
+    "statics": "/api/report/energy/getStaticsByDay",
+}
+
+def api_paths(system, endpoints=ENDPOINTS):
+    """Relative URLs of the given report endpoints for one system."""
+    query = f"sysSn={system['sys_sn']}&stationId={system['station_id']}"
+    return [f"{ENDPOINTS[e]}?{query}" for e in endpoints]
+
+def endpoint_for_url(url):
+    path = urlparse(url).path
+    return next((name for name, p in ENDPOINTS.items() if p == path), None)
+
+def poll_seq(headers):
+    """The poll cycle a request was tagged with, or None (e.g. the dashboard's own calls)."""
+    try:
+        return int(headers.get("x-poll-seq"))
+    except (TypeError, ValueError):
+        return None
+
+def trigger_api_requests(page, endpoints=ENDPOINTS):
+    """Fire this cycle's XHRs, tagged with the cycle and aborted at the deadline."""
+    seq = tracker.next_cycle()
+    urls = [api_paths(system, [endpoint])[0] for system in SYSTEMS for endpoint in endpoints
+            if tracker.begin((system["sys_sn"], endpoint), seq)]
+    if not urls:
+        return
+    page.evaluate("""([urls, seq, ms]) => { urls.forEach(u => {
+        const ctl = new AbortController();
+        const timer = setTimeout(() => ctl.abort(), ms);
+        fetch(u, {headers: {"X-Poll-Seq": String(seq)}, signal: ctl.signal})
+            .catch(() => {}).finally(() => clearTimeout(timer));
+    }); }""", [urls, seq, int(REQUEST_TIMEOUT * 1000)])
+
+def note_request_failed(req):
+    """A tagged XHR died without a response (network error or our deadline abort)."""
+    seq = poll_seq(req.headers)
+    system = system_for_url(req.url)
+    if seq is None or system is None:
+        return
+    tracker.fail((system["sys_sn"], endpoint_for_url(req.url)), seq,
+                 timed_out="abort" in (req.failure or "").lower())
+    watchdog.note_transport_error()
+    # Back off as fetch_direct does when the cloud stops answering
+    if adaptive:
+        adaptive.record_error()
+
+def capture_session():
+    """Log in with a short-lived browser and return the headers/cookies the SPA uses for API calls."""
+    from playwright.sync_api import sync_playwright
+    api_headers = {}
+    with sync_playwright() as p:
+        browser = launch_browser(p)
+        page = new_browser_context(browser).new_page()
+        page.on("request", lambda req: api_headers.update(req.headers) if "/api/" in req.url else None)
+        try:
+            if not login_by_labels(page, f"{BYTEWATT_URL}/login", BYTEWATT_USERNAME, BYTEWATT_PASSWORD):
+                return None
+            # Let the dashboard fire its own API calls so we see the auth headers
+            page.wait_for_load_state("networkidle")
+            auth = {"headers": api_headers, "cookies": page.context.cookies(),
+                    "storage_state": page.context.storage_state()}
+            save_session(auth)
+            return auth
+        finally:
+            browser.close()
+
+def resume_browser_session(page):
+    """Open the dashboard with restored storage state; False if it bounces to the login page."""
+    try:
+        page.goto(BYTEWATT_URL)
+        page.wait_for_selector("text=Dashboard", timeout=5000)
+        return "/login" not in page.url
+    except Exception:
+        return False
+
+def browser_login(page):
+    """Log the page in through the form and persist the resulting storage state."""
+    if not login_by_labels(page, f"{BYTEWATT_URL}/login", BYTEWATT_USERNAME, BYTEWATT_PASSWORD):
+        return False
+    save_session({"cookies": page.context.cookies(), "storage_state": page.context.storage_state()})
+    return True
 
-    # Fire off XHRs
-    page.evaluate(f"""() => {{
-        fetch("{energy_url}");
-        fetch("{power_url}");
-        fetch("{stats_url}");
-    }}""")
+def login_with_retry(login, first_delay=30, max_delay=900, sleep=time.sleep):
+    """Call login() until it returns something truthy, backing off between tries.
+
+    The cloud or the network being down at startup (e.g. right after a
+    watchdog re-exec) must not end the add-on for good.
+    """
+    delay = first_delay
+    while True:
+        try:
+            result = login()
+        except Exception as e:
+            print("Login error:", e)
+            result = None
+        if result:
+            return result
+        print(f"Login failed—check credentials or connectivity; retrying in {delay:.0f}s")
+        sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+# Cycle tags, deadlines and in-flight limits of the report requests
+tracker = RequestTracker(deadline=REQUEST_TIMEOUT, max_in_flight=REQUEST_MAX_IN_FLIGHT)
+session_expired = threading.Event()
+
+def fetch_direct(session, system, endpoint, seq, mqtt_client):
+    """Fetch one endpoint for one system and publish the result as soon as it arrives."""
+    path = api_paths(system, [endpoint])[0]
+    try:
+        resp = session.get(path)
+    except Exception as e:
+        tracker.fail((system["sys_sn"], endpoint), seq, timed_out=isinstance(e, RequestTimeout))
+        watchdog.note_transport_error()
+        if adaptive:
+            adaptive.record_error()
+        print(f"Request error for {path}: {e}")
+        return
+    resp.seq = seq
+    handle_response(resp, mqtt_client)
+
+def poll_direct(session, executor, mqtt_client, endpoints=ENDPOINTS):
+    """Queue this cycle's fetches, skipping any (system, endpoint) at its in-flight limit."""
+    seq = tracker.next_cycle()
+    for system in SYSTEMS:
+        for endpoint in endpoints:
+            if not tracker.begin((system["sys_sn"], endpoint), seq):
+                print(f"{system['name']}: {endpoint} still has {REQUEST_MAX_IN_FLIGHT} request(s) in flight, skipping")
+                continue
+            executor.submit(fetch_direct, session, system, endpoint, seq, mqtt_client)
 
 # ─── Process Responses ──────────────────────────────────────────────────────────
-latest_statics_by_day = None
+# Set up once MQTT is; handlers then only enqueue, the publisher worker
+# publishes and the recorder does the disk bookkeeping
+publish_queue = None
+recorder = None
+
+def record_later(fn, *args):
+    """Run bookkeeping on the recorder thread (inline without one)."""
+    if recorder:
+        recorder.submit(fn, *args)
+    else:
+        fn(*args)
+
+def publish_stats(mqtt_client, system, group, payload, stats):
+    """Hand a processed sample to the publisher thread (or publish inline without one)."""
+    if publish_queue:
+        publish_queue.put(system, group, payload, stats)
+    else:
+        deliver(mqtt_client, system, group, payload, stats)
+
+def deliver(mqtt_client, system, group, payload, stats):
+    """Make a sample readable locally, then send it to MQTT."""
+    if READ_API_PORT:
+        snapshots.update(system["sys_sn"], group, payload)
+    send_stats(mqtt_client, system, group, payload, stats)
+
+def send_stats(mqtt_client, system, group, payload, stats):
+    """Publish a processed sample according to PUBLISH_MODE."""
+    if PUBLISH_MODE == "fields":
+        for field, value in stats.items():
+            field_publisher.offer(mqtt_client, f"{system['topic']}/{group}/{field}", value)
+    else:
+        mqtt_client.publish(f"{system['topic']}/{group}", json.dumps(payload), retain=RETAIN)
+
+# Latest getStaticsByDay payload per system serial
+latest_statics_by_day = {}
 
-def process_energy_statistics(response, mqtt_client):
-    global latest_statics_by_day
+def process_energy_statistics(response, mqtt_client, system):
     data = response.json()
     if data.get('code') == 200 and 'data' in data:
         energy = data['data']
+        now = datetime.now()
         payload = {
-            "timestamp": datetime.now().isoformat(),
-            "system_sn": SYS_SN,
-            "energy_stats": {
-                "solar_today":       energy.get("epvT", 0),
-                "total_consumption": energy.get("eload", 0),
-                "feed_in":           energy.get("eout", 0),
-                "grid_import":       energy.get("einput", 0),
-                "battery_charge":    energy.get("echarge", 0),
-                "battery_discharge": energy.get("edischarge", 0),
-                "self_consumption":  energy.get("eselfConsumption", 0),
-                "self_sufficiency":  energy.get("eselfSufficiency", 0)
-            }
+            "timestamp": now.isoformat(),
+            "system_sn": system["sys_sn"],
+            "energy_stats": extract("energy_stats", energy)
         }
-        mqtt_client.publish(f"{MQTT_TOPIC_PREFIX}/energy_stats", json.dumps(payload), retain=True)
-        #save_data_locally(payload, "energy_stats")
+        publish_stats(mqtt_client, system, "energy_stats", payload, payload["energy_stats"])
+        record_later(record_sample, "energy", system, now, payload["energy_stats"])
 
-def process_power_data(response, mqtt_client):
+def process_power_data(response, mqtt_client, system):
     data = response.json()
     if data.get('code') == 200 and 'data' in data:
         pd = data['data']
+        now = datetime.now()
         payload = {
-            "timestamp": datetime.now().isoformat(),
-            "power_stats": {
-                "pv_production": pd.get("pvPower", 0),
-                "load":          pd.get("powerLoad", 0),
-                "battery":       pd.get("batteryPower", 0),
-                "grid":          pd.get("gridPower", 0)
-            }
+            "timestamp": now.isoformat(),
+            "power_stats": extract("power_data", pd)
         }
-        mqtt_client.publish(f"{MQTT_TOPIC_PREFIX}/power_data", json.dumps(payload), retain=True)
-        #save_data_locally(payload, "power_data")
+        publish_stats(mqtt_client, system, "power_data", payload, payload["power_stats"])
+        record_later(record_power_sample, mqtt_client, system, now, payload["power_stats"])
+
+def record_power_sample(mqtt_client, system, now, stats):
+    record_sample("power", system, now, stats)
+    track_energy(mqtt_client, system, now, stats)
+    if adaptive:
+        adaptive.record(system["sys_sn"], stats)
 
-def process_statics_by_day(response, mqtt_client):
-    global latest_statics_by_day
+def process_statics_by_day(response, mqtt_client, system):
     data = response.json()
     if data.get('code') == 200 and 'data' in data:
-        latest_statics_by_day = data['data']
+        latest_statics_by_day[system["sys_sn"]] = data['data']
+        stats = extract("statics_by_day", data['data'])
+        publish_stats(mqtt_client, system, "statics_by_day",
+                      {"timestamp": datetime.now().isoformat(), "statics_by_day": stats}, stats)
+
+def system_for_url(url):
+    """Find the configured system a report URL belongs to, by its sysSn parameter."""
+    sn = parse_qs(urlparse(url).query).get("sysSn", [""])[0]
+    for system in SYSTEMS:
+        if system["sys_sn"] == sn:
+            return system
+    return None
+
+def note_poll_error(resp):
+    """Tell the adaptive controller and watchdog about server errors and rate limiting; True if resp is one."""
+    try:
+        data = resp.json()
+        code = data.get("code") if isinstance(data, dict) else None
+    except Exception:
+        code = None
+    rate_limited = resp.status == 429 or code == 429
+    if not rate_limited and resp.status < 500:
+        return False
+    if adaptive:
+        adaptive.record_error(rate_limited)
+    # The cloud is answering, just slowing us down or failing on its side:
+    # the page and session work, and recycling them would not help
+    watchdog.note_response()
+    print(f"{'Rate limited' if rate_limited else 'Server error'} on {resp.url} (HTTP {resp.status})")
+    return True
+
+HANDLERS = {
+    "/getEnergyStatistics": process_energy_statistics,
+    "/getLastPowerData":    process_power_data,
+    "/getStaticsByDay":     process_statics_by_day,
+}
+
+def handle_response(resp, mqtt_client):
+    """Route an API response to its handler by URL."""
+    handler = next((h for marker, h in HANDLERS.items() if marker in resp.url), None)
+    system = system_for_url(resp.url)
+    if handler is None or system is None:
+        return
+    name = handler.__name__
+    if isinstance(resp, ApiResponse):
+        seq = resp.seq
+    else:
+        seq = poll_seq(resp.request.headers)
+        if seq is None:
+            # The dashboard's own polling: outside the cycle ordering, it could
+            # overwrite newer state, so only our tagged requests are handled
+            return
+    if not tracker.complete((system["sys_sn"], endpoint_for_url(resp.url)), seq):
+        # An older cycle's answer arriving after a newer one was handled
+        return
+    try:
+        if not isinstance(resp, ApiResponse):
+            # Browser response: pull the body once so it is decoded only once
+            resp = ApiResponse(resp.url, resp.status, resp.body())
+        if ARCHIVE and POLL_MODE != "replay":
+            record_later(archive.write, resp.url, resp.status, resp.body)
+        with DECODE_SECONDS.time():
+            resp.json()
+    except Exception:
+        if is_auth_error(resp):
+            AUTH_FAILURES.inc()
+            session_expired.set()
+        elif not note_poll_error(resp):
+            HANDLER_ERRORS.inc(handler=name)
+            print(f"Unreadable response from {resp.url} (HTTP {resp.status})")
+        return
+    if is_auth_error(resp):
+        AUTH_FAILURES.inc()
+        session_expired.set()
+        return
+    if note_poll_error(resp):
+        return
+    RESPONSES.inc(handler=name)
+    try:
+        with HANDLER_SECONDS.time(handler=name):
+            handler(resp, mqtt_client, system)
+        watchdog.note_response()
+        if not startup.reported:
+            startup.finish()
+    except Exception as e:
+        HANDLER_ERRORS.inc(handler=name)
+        print(f"Error processing {resp.url}: {e}")
 
 # ─── Home Assistant Auto-Discovery ──────────────────────────────────────────────
-def publish_discovery_messages(client):
-    base = MQTT_TOPIC_PREFIX + "/"
+def field_source(base, group, field, scale=""):
+    """state_topic/value_template pair for a field, matching PUBLISH_MODE."""
+    if PUBLISH_MODE == "fields":
+        return {"state_topic": f"{base}{group}/{field}",
+                "value_template": "{{ value | float" + scale + " }}"}
+    return {"state_topic": f"{base}{group}",
+            "value_template": f"{{{{ value_json.{GROUP_KEYS[group]}.{field}{scale} }}}}"}
+
+def discovery_sensors(system):
+    """Discovery entries for every catalog sensor of one system."""
+    base = system["topic"] + "/"
+    out = []
+    for group, spec in CATALOG.items():
+        if spec.get("local") and not LOCAL_ENERGY:
+            continue
+        for s in spec["sensors"]:
+            out.append({
+                "name": s["name"],
+                "unique_id": f"{system['uid']}_{s['uid']}",
+                **field_source(base, group, s["field"], s["scale"]),
+                "unit_of_measurement": s["unit"],
+                "device_class": s["device_class"],
+                "state_class": s["state_class"]
+            })
+    return out
+
+def load_discovery_hashes(target):
+    """Hashes last published to target ("broker:port/prefix"); none if they went elsewhere."""
+    try:
+        with open(DISCOVERY_CACHE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("target") != target:
+        return {}
+    return cache.get("hashes") or {}
+
+def save_discovery_hashes(target, hashes):
+    try:
+        tmp = DISCOVERY_CACHE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"target": target, "hashes": hashes}, f)
+        os.replace(tmp, DISCOVERY_CACHE)
+    except OSError as e:
+        print(f"Error saving discovery hashes: {e}")
+
+def publish_discovery_messages(client, force=False):
+    """Publish the discovery configs that changed since the last run (all of them if force).
+
+    Configs that are no longer generated are removed from Home Assistant.
+    """
     disc = "homeassistant/sensor/bytewatt/"
-    sensors = [
-        {
-            "name": "Current Solar Production",
-            "unique_id": "bytewatt_current_solar_production",
-            "state_topic": f"{base}power_data",
-            "value_template": "{{ value_json.power_stats.pv_production }}",
-            "unit_of_measurement": "W",
-            "device_class": "power",
-            "state_class": "measurement"
-        },
-        {
-            "name": "Current Power Load Requirements",
-            "unique_id": "bytewatt_current_load",
-            "state_topic": f"{base}power_data",
-            "value_template": "{{ value_json.power_stats.load }}",
-            "unit_of_measurement": "W",
-            "device_class": "power",
-            "state_class": "measurement"
-        },
-        {
-            "name": "Battery Power",
-            "unique_id": "bytewatt_battery_power",
-            "state_topic": f"{base}power_data",
-            "value_template": "{{ value_json.power_stats.battery }}",
-            "unit_of_measurement": "W",
-            "device_class": "power",
-            "state_class": "measurement"
-        },
-        {
-            "name": "Grid Power",
-            "unique_id": "bytewatt_grid_power",
-            "state_topic": f"{base}power_data",
-            "value_template": "{{ value_json.power_stats.grid }}",
-            "unit_of_measurement": "W",
-            "device_class": "power",
-            "state_class": "measurement"
-        },
-        {
-            "name": "Today’s Solar Energy (kWh)",
-            "unique_id": "bytewatt_solar_today",
-            "state_topic": f"{base}energy_stats",
-            "value_template": "{{ value_json.energy_stats.solar_today / 1000 }}",
-            "unit_of_measurement": "kWh",
-            "device_class": "energy",
-            "state_class": "total_increasing"
-        },
-        {
-            "name": "Today’s Consumption (kWh)",
-            "unique_id": "bytewatt_consumption_today",
-            "state_topic": f"{base}energy_stats",
-            "value_template": "{{ value_json.energy_stats.total_consumption / 1000 }}",
-            "unit_of_measurement": "kWh",
-            "device_class": "energy",
-            "state_class": "total_increasing"
-        }
-        # Add more if desired...
-    ]
-    for s in sensors:
-        topic = f"{disc}{s['unique_id']}/config"
-        payload = {
-            "name": s["name"],
-            "state_topic": s["state_topic"],
-            "unique_id": s["unique_id"],
-            "unit_of_measurement": s["unit_of_measurement"],
-            "device_class": s["device_class"],
-            "state_class": s["state_class"],
-            "value_template": s["value_template"],
-            "json_attributes_topic": None,
-            "availability_topic": f"{MQTT_TOPIC_PREFIX}/status"
-        }
-        client.publish(topic, json.dumps(payload), retain=True)
+    configs = dict(discovery_config(disc, system, s) for system in SYSTEMS for s in discovery_sensors(system))
+    if METRICS_MQTT:
+        configs.update(discovery_config(disc, MONITOR_DEVICE, s) for s in diagnostic_sensors())
+    if adaptive:
+        configs.update([discovery_config(disc, MONITOR_DEVICE, {
+            "name": "Power Poll Interval", "unique_id": "bytewatt_monitor_poll_interval",
+            "state_topic": f"{MQTT_TOPIC_PREFIX}/diagnostics/poll_interval",
+            "value_template": "{{ value }}", "unit_of_measurement": "s",
+            "device_class": "duration", "state_class": "measurement",
+            "entity_category": "diagnostic"})])
+    target = f"{MQTT_BROKER}:{MQTT_PORT}/{disc}"
+    hashes, changed, removed = diff_configs(configs, load_discovery_hashes(target), force)
+    for topic in changed:
+        client.publish(topic, configs[topic], retain=True)
+    for topic in removed:
+        client.publish(topic, "", retain=True)
+    save_discovery_hashes(target, hashes)
+    print(f"Discovery: {len(changed)} of {len(configs)} configs published, {len(removed)} removed")
     client.publish(f"{MQTT_TOPIC_PREFIX}/status", "online", retain=True)
 
+def discovery_config(disc, system, s):
+    """(config topic, JSON body) of one discovery entry."""
+    topic = f"{disc}{s['unique_id']}/config"
+    name = s["name"] if not system["key"] else f"{system['name']} {s['name']}"
+    payload = {
+        "name": name,
+        "state_topic": s["state_topic"],
+        "unique_id": s["unique_id"],
+        "unit_of_measurement": s["unit_of_measurement"],
+        "device_class": s["device_class"],
+        "state_class": s["state_class"],
+        "value_template": s["value_template"],
+        "json_attributes_topic": None,
+        "availability_topic": f"{MQTT_TOPIC_PREFIX}/status",
+        "device": {"identifiers": [system["uid"]], "name": system["name"], "manufacturer": "ByteWatt"}
+    }
+    if "entity_category" in s:
+        payload["entity_category"] = s["entity_category"]
+    return topic, json.dumps(payload)
+
+# ─── Diagnostics ────────────────────────────────────────────────────────────────
+# Pseudo-system the add-on's own diagnostic entities are grouped under
+MONITOR_DEVICE = {"uid": "bytewatt_monitor", "name": "ByteWatt Monitor", "key": ""}
+
+def diagnostics_snapshot():
+    """A few headline numbers from the metrics, for the MQTT diagnostic sensors."""
+    return {
+        "poll_ms":          round(POLL_SECONDS.mean(endpoint="power") * 1000, 2),
+        "request_ms":       round(REQUEST_SECONDS.mean(endpoint="power") * 1000, 2),
+        "handler_ms":       round(HANDLER_SECONDS.mean(handler="process_power_data") * 1000, 3),
+        "decode_ms":        round(DECODE_SECONDS.mean() * 1000, 3),
+        "publish_ms":       round(PUBLISH_SECONDS.mean() * 1000, 3),
+        "queue_ms":         round(QUEUE_SECONDS.mean(group="power_data") * 1000, 3),
+        "queue_depth":      len(publish_queue.queue) if publish_queue else 0,
+        "queue_dropped":    sum(DROPPED.values.values()),
+        "request_timeouts": sum(TIMEOUTS.values.values()),
+        "stale_responses":  sum(STALE.values.values()),
+        "missed_ticks":     sum(j.missed for j in active_scheduler.jobs) if active_scheduler else 0,
+        "handler_errors":   sum(HANDLER_ERRORS.values.values()),
+        "browser_rss_mb":   round(procstats.children_rss() / 2**20, 1),
+        "python_rss_mb":    round(procstats.python_rss() / 2**20, 1),
+    }
+
+def diagnostic_sensors():
+    base = f"{MQTT_TOPIC_PREFIX}/diagnostics"
+    def sensor(key, name, unit, device_class=None):
+        return {"name": name, "unique_id": f"bytewatt_monitor_{key}", "state_topic": base,
+                "value_template": f"{{{{ value_json.{key} }}}}", "unit_of_measurement": unit,
+                "device_class": device_class, "state_class": "measurement",
+                "entity_category": "diagnostic"}
+    return [
+        sensor("poll_ms", "Poll Duration", "ms", "duration"),
+        sensor("request_ms", "Cloud Request Duration", "ms", "duration"),
+        sensor("handler_ms", "Handler Duration", "ms", "duration"),
+        sensor("decode_ms", "JSON Decode Duration", "ms", "duration"),
+        sensor("publish_ms", "MQTT Publish Duration", "ms", "duration"),
+        sensor("queue_ms", "Publish Queue Latency", "ms", "duration"),
+        sensor("queue_depth", "Publish Queue Depth", None),
+        sensor("queue_dropped", "Publish Queue Drops", None),
+        sensor("request_timeouts", "Request Timeouts", None),
+        sensor("stale_responses", "Stale Responses Dropped", None),
+        sensor("missed_ticks", "Missed Poll Ticks", None),
+        sensor("handler_errors", "Handler Errors", None),
+        sensor("browser_rss_mb", "Browser Memory", "MB", "data_size"),
+        sensor("python_rss_mb", "Python Memory", "MB", "data_size"),
+    ]
+
+def publish_diagnostics(mqtt_client):
+    mqtt_client.publish(f"{MQTT_TOPIC_PREFIX}/diagnostics", json.dumps(diagnostics_snapshot()), retain=True)
+
 # ─── Main Monitoring Loop ───────────────────────────────────────────────────────
-def monitor_system_data():
-    mqtt_client = setup_mqtt()
-    if not mqtt_client:
-        print("MQTT initialization failed. Exiting.")
-        return
+def statics_basename(system):
+    return "statics_by_day" if not system["key"] else f"statics_by_day_{system['key']}"
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+def save_daily_summary(now):
+    for system in SYSTEMS:
+        stats = latest_statics_by_day.get(system["sys_sn"])
+        if stats:
+            save_data_locally({"timestamp": now.isoformat(),
+                               "statics_by_day": stats},
+                              statics_basename(system))
+
+# ─── Backfill of Missed Days ────────────────────────────────────────────────────
+def have_daily_summary(system, day):
+    return os.path.exists(os.path.join(DATA_DIR, f"{statics_basename(system)}_{day}.json"))
+
+def save_backfilled_summary(system, day, stats):
+    save_data_locally({"timestamp": datetime.now().isoformat(),
+                       "statics_by_day": stats,
+                       "backfilled": True},
+                      statics_basename(system), day)
+
+def fetch_statics(session, system, day):
+    return fetch_statics_for_day(session, api_paths(system, ["statics"])[0], day,
+                                 is_auth_error, STATICS_DATE_PARAM)
+
+backfill = Backfill(os.path.join(DATA_DIR, "backfill_index.json"),
+                    save_backfilled_summary, have_daily_summary, BACKFILL_CONCURRENCY)
+
+def start_backfill(session):
+    """Fetch missing daily summaries in the background over an HTTP session."""
+    if BACKFILL_DAYS > 0:
+        backfill.start(SYSTEMS, BACKFILL_DAYS, lambda system, day: fetch_statics(session, system, day))
 
-        if not login_by_labels(page, "https://monitor.byte-watt.com/login", "", ""):
-            print("Login failed—check credentials.")
+def direct_poll(session, executor, mqtt_client, endpoints):
+    """One scheduled direct-mode poll, logging in again first if the cloud rejected the session."""
+    if session_expired.is_set():
+        print("Session rejected, logging in again...")
+        auth = capture_session()
+        if not auth:
             return
+        session.set_auth(auth)
+        session_expired.clear()
+    poll_direct(session, executor, mqtt_client, endpoints)
 
-        # Intercept XHRs and process
-        page.on("response", lambda resp: (
-            process_energy_statistics(resp, mqtt_client) if "/getEnergyStatistics" in resp.url else None,
-            process_power_data(resp, mqtt_client)      if "/getLastPowerData"     in resp.url else None,
-            process_statics_by_day(resp, mqtt_client)  if "/getStaticsByDay"      in resp.url else None
-        ))
+def monitor_direct(mqtt_client):
+    from direct import DirectSession
+    session = DirectSession(BYTEWATT_URL, pool_size=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT)
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+    with startup.phase("login"):
+        auth = load_session()
+        if auth and (auth.get("headers") or auth.get("cookies")):
+            print("Reusing saved session, polling over HTTP...")
+        else:
+            auth = login_with_retry(capture_session)
+            print("Session captured, polling over HTTP...")
+        session.set_auth(auth)
 
-        try:
-            while True:
-                now = datetime.now()
+    def poll(endpoints):
+        direct_poll(session, executor, mqtt_client, endpoints)
+
+    def recycle(action):
+        # Drop pooled connections (they may be wedged) and log in afresh
+        session.session.close()
+        session_expired.set()
+        return True
+
+    start_backfill(session)
+    sched = build_scheduler(poll, mqtt_client)
+    sched.daily_at("00:15", lambda: start_backfill(session), name="backfill")
+    if WATCHDOG:
+        sched.every(WATCHDOG_INTERVAL, lambda: run_watchdog(recycle), name="watchdog")
+
+    try:
+        sched.run()
+    except KeyboardInterrupt:
+        print("\nMonitoring stopped by user")
+    finally:
+        executor.shutdown(wait=False)
+        session.close()
+
+def monitor_replay(mqtt_client):
+    """Push archived responses for REPLAY_FROM..REPLAY_TO back through the handlers."""
+    end = parse_time(REPLAY_TO) if REPLAY_TO else time.time()
+    start = parse_time(REPLAY_FROM) if REPLAY_FROM else end - 86400
+    print(f"Replaying archived responses from {datetime.fromtimestamp(start)} "
+          f"to {datetime.fromtimestamp(end)}...")
+    count, prev = 0, None
+    try:
+        for rec in archive.read(start, end):
+            if REPLAY_SPEED and prev is not None:
+                time.sleep(max(0.0, (rec["ts"] - prev) / REPLAY_SPEED))
+            prev = rec["ts"]
+            handle_response(ApiResponse(rec["url"], rec["status"], rec["body"]), mqtt_client)
+            count += 1
+    except KeyboardInterrupt:
+        print("\nReplay stopped by user")
+    print(f"Replayed {count} archived responses")
+
+def monitor_browser(mqtt_client):
+    startup.begin("browser_launch")
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        browser = launch_browser(p)
+        startup.end("browser_launch")
+        saved = load_session() or {}
+        # Current context and page (the watchdog may replace either), the
+        # headers the SPA last sent to the API, for backfill over plain HTTP,
+        # and whether this login has sent any yet
+        state = {"context": new_browser_context(browser, storage_state=saved.get("storage_state")),
+                 "api_headers": dict(saved.get("headers") or {}), "api_seen": False,
+                 "backfill_due": False}
+
+        def note_api_request(req):
+            if "/api/" in req.url:
+                state["api_headers"].update(req.headers)
+                state["api_seen"] = True
 
-                # Fire requests every 30 seconds
-                if now.second % 30 == 0:
-                    trigger_api_requests(page)
+        def open_page():
+            page = state["page"] = state["context"].new_page()
+            page.on("request", note_api_request)
+            # Intercept XHRs and process
+            page.on("response", lambda resp: handle_response(resp, mqtt_client))
+            page.on("requestfailed", note_request_failed)
+            return page
 
-                # Save daily summary at 23:56
-                if now.hour == 23 and now.minute == 56 and now.second < 5:
-                    if latest_statics_by_day:
-                        save_data_locally({"timestamp": now.isoformat(),
-                                           "statics_by_day": latest_statics_by_day},
-                                          "statics_by_day")
-                # Keep session alive: full page reload twice an hour
-                if now.minute % 30 == 0 and now.second < 5:
-                    page.reload(wait_until="domcontentloaded")
+        page = open_page()
+        with startup.phase("login"):
+            if saved.get("storage_state") and resume_browser_session(page):
+                print("Reusing saved session! Monitoring system data...")
+            else:
+                login_with_retry(lambda: browser_login(page))
 
-                time.sleep(1)
+        def poll(endpoints):
+            if session_expired.is_set():
+                print("Session rejected, logging in again...")
+                if not browser_login(state["page"]):
+                    return
+                session_expired.clear()
+            trigger_api_requests(state["page"], endpoints)
+            if state["backfill_due"]:
+                backfill_over_http()
 
+        def recycle(action):
+            """Replace the page, or the whole context (keeping its storage), and get back to the dashboard."""
+            if action == "context":
+                storage = state["context"].storage_state()
+                state["context"].close()
+                state["context"] = new_browser_context(browser, storage_state=storage)
+            else:
+                state["page"].close()
+            page = open_page()
+            return resume_browser_session(page) or browser_login(page)
+
+        def backfill_over_http():
+            # Page fetches are tied to this thread; backfill borrows the page's
+            # auth instead, so it waits for an API request to show what that is
+            if not state["api_seen"]:
+                state["backfill_due"] = True
+                return
+            state["backfill_due"] = False
+            from direct import DirectSession
+            http = DirectSession(BYTEWATT_URL, pool_size=BACKFILL_CONCURRENCY, timeout=REQUEST_TIMEOUT)
+            http.set_auth({"headers": state["api_headers"], "cookies": state["context"].cookies()})
+            start_backfill(http)
+
+        backfill_over_http()
+        sched = build_scheduler(poll, mqtt_client)
+        sched.daily_at("00:15", backfill_over_http, name="backfill")
+        if TRAFFIC_REPORT:
+            sched.every(POLL_INTERVALS["power"], report_traffic, name="traffic_report")
+        if RELOAD_MINUTES:
+            sched.every(RELOAD_MINUTES * 60, lambda: reload_page(state["page"]), name="reload")
+        if WATCHDOG:
+            sched.every(WATCHDOG_INTERVAL, lambda: run_watchdog(recycle), name="watchdog")
+
+        def wait(seconds):
+            # Playwright only dispatches page events inside its own calls, so
+            # idle through one: responses are then handled (and timed) as they
+            # arrive instead of during the next poll
+            try:
+                state["page"].wait_for_timeout((seconds if seconds is not None else 1) * 1000)
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                time.sleep(seconds if seconds is not None else 1)
+
+        try:
+            sched.run(wait)
         except KeyboardInterrupt:
             print("\nMonitoring stopped by user")
         finally:
             browser.close()
-            mqtt_client.publish(f"{MQTT_TOPIC_PREFIX}/status", "offline", retain=True)
-            mqtt_client.disconnect()
+
+def reload_page(page):
+    with RELOAD_SECONDS.time():
+        page.reload(wait_until="domcontentloaded")
+
+def monitor_system_data():
+    global publish_queue, recorder
+    startup.record("imports", STARTED, time.monotonic())
+    mqtt_client = setup_mqtt()
+    if not mqtt_client:
+        print("MQTT initialization failed. Exiting.")
+        return
+    publish_queue = PublishQueue(lambda s: deliver(mqtt_client, s.system, s.group, s.payload, s.stats),
+                                 maxsize=PUBLISH_QUEUE_SIZE,
+                                 policy="block" if POLL_MODE == "replay" else PUBLISH_OVERFLOW,
+                                 # A replay runs flat out and must not lose samples, so it
+                                 # waits for room however long the broker takes
+                                 block_timeout=None if POLL_MODE == "replay" else 1.0).start()
+    recorder = Recorder(maxsize=PUBLISH_QUEUE_SIZE,
+                        block_timeout=None if POLL_MODE == "replay" else 1.0).start()
+    threading.Thread(target=housekeeping, daemon=True).start()
+    if METRICS_PORT:
+        try:
+            metrics.serve(METRICS_PORT, METRICS_HOST)
+        except OSError as e:
+            print(f"Could not start metrics endpoint on {METRICS_HOST}:{METRICS_PORT}: {e}")
+    if READ_API_PORT:
+        try:
+            readapi.serve(snapshots, READ_API_PORT, SYSTEMS[0]["sys_sn"], READ_API_HOST)
+        except OSError as e:
+            print(f"Could not start read API on {READ_API_HOST}:{READ_API_PORT}: {e}")
+
+    try:
+        if POLL_MODE == "direct":
+            monitor_direct(mqtt_client)
+        elif POLL_MODE == "replay":
+            monitor_replay(mqtt_client)
+        else:
+            monitor_browser(mqtt_client)
+    finally:
+        # The recorder feeds the publish queue (local energy), so it stops first
+        recorder.stop()
+        publish_queue.stop(timeout=60 if POLL_MODE == "replay" else 5)
+        mqtt_client.publish(f"{MQTT_TOPIC_PREFIX}/status", "offline", retain=RETAIN)
+        mqtt_client.disconnect()
+        mqtt_client.spool.close()
+        ts_store.close()
+        archive.close()
 
 if __name__ == "__main__":
-    run_scheduler()
     monitor_system_data()
-d run.py content here
@@ -11,6 +11,62 @@ export MQTT_USERNAME="$(jq -r '.mqtt_username' $CONFIG)"
 export MQTT_PASSWORD="$(jq -r '.mqtt_password' $CONFIG)"
 export SYS_SN="$(jq -r '.system_sn' $CONFIG)"
 export STATION_ID="$(jq -r '.station_id' $CONFIG)"
+export BYTEWATT_USERNAME="$(jq -r '.bytewatt_username' $CONFIG)"
+export BYTEWATT_PASSWORD="$(jq -r '.bytewatt_password' $CONFIG)"
+export POLL_MODE="$(jq -r '.poll_mode // "browser"' $CONFIG)"
+export MAX_CONCURRENCY="$(jq -r '.max_concurrency // 4' $CONFIG)"
+export POLL_INTERVAL_POWER="$(jq -r '.poll_interval_power // 30' $CONFIG)"
+export POLL_INTERVAL_ENERGY="$(jq -r '.poll_interval_energy // 60' $CONFIG)"
+export POLL_INTERVAL_STATICS="$(jq -r '.poll_interval_statics // 900' $CONFIG)"
+export POLL_JITTER="$(jq -r '.poll_jitter // 0' $CONFIG)"
+export SCHEDULE_POLICY="$(jq -r '.schedule_policy // "skip"' $CONFIG)"
+export TS_RAW_DAYS="$(jq -r '.ts_raw_days // 7' $CONFIG)"
+export TS_RETENTION_DAYS="$(jq -r '.ts_retention_days // 365' $CONFIG)"
+export PUBLISH_MODE="$(jq -r '.publish_mode // "json"' $CONFIG)"
+export DEADBAND_ABS="$(jq -r '.deadband_abs // 0' $CONFIG)"
+export DEADBAND_REL="$(jq -r '.deadband_rel // 0' $CONFIG)"
+export PUBLISH_MAX_AGE="$(jq -r '.publish_max_age // 300' $CONFIG)"
+export PUBLISH_BATCH_SECONDS="$(jq -r '.publish_batch_seconds // 0' $CONFIG)"
+export DEADBANDS="$(jq -c '.deadbands // []' $CONFIG)"
+export SPOOL_MAX_MB="$(jq -r '.spool_max_mb // 50' $CONFIG)"
+export RESTART_TIMES="$(jq -r '.restart_times // ""' $CONFIG)"
+export RELOAD_MINUTES="$(jq -r '.reload_minutes // 0' $CONFIG)"
+export LEAN_BROWSER="$(jq -r 'if .lean_browser == false then "false" else "true" end' $CONFIG)"
+export TRAFFIC_REPORT="$(jq -r '.traffic_report // false' $CONFIG)"
+export METRICS_PORT="$(jq -r '.metrics_port // 0' $CONFIG)"
+export METRICS_HOST="$(jq -r '.metrics_host // "127.0.0.1"' $CONFIG)"
+export METRICS_MQTT="$(jq -r '.metrics_mqtt // false' $CONFIG)"
+export ADAPTIVE_POLLING="$(jq -r '.adaptive_polling // false' $CONFIG)"
+export ADAPTIVE_MIN="$(jq -r '.adaptive_min // 10' $CONFIG)"
+export ADAPTIVE_MAX="$(jq -r '.adaptive_max // 300' $CONFIG)"
+export ADAPTIVE_FAST_DELTA="$(jq -r '.adaptive_fast_delta // 300' $CONFIG)"
+export ADAPTIVE_SLOW_DELTA="$(jq -r '.adaptive_slow_delta // 50' $CONFIG)"
+export ADAPTIVE_QUIET_HOURS="$(jq -r '.adaptive_quiet_hours // "23-6"' $CONFIG)"
+export ADAPTIVE_MAX_BACKOFF="$(jq -r '.adaptive_max_backoff // 900' $CONFIG)"
+export BACKFILL_DAYS="$(jq -r '.backfill_days // 14' $CONFIG)"
+export BACKFILL_CONCURRENCY="$(jq -r '.backfill_concurrency // 2' $CONFIG)"
+export LOCAL_ENERGY="$(jq -r 'if .local_energy == false then "false" else "true" end' $CONFIG)"
+export ENERGY_MAX_GAP="$(jq -r '.energy_max_gap // 600' $CONFIG)"
+export PUBLISH_QUEUE_SIZE="$(jq -r '.publish_queue_size // 1000' $CONFIG)"
+export PUBLISH_OVERFLOW="$(jq -r '.publish_overflow // "drop_oldest"' $CONFIG)"
+export ARCHIVE="$(jq -r 'if .archive == false then "false" else "true" end' $CONFIG)"
+export ARCHIVE_DAYS="$(jq -r '.archive_days // 30' $CONFIG)"
+export REPLAY_FROM="$(jq -r '.replay_from // ""' $CONFIG)"
+export REPLAY_TO="$(jq -r '.replay_to // ""' $CONFIG)"
+export REPLAY_SPEED="$(jq -r '.replay_speed // 0' $CONFIG)"
+export REPLAY_LIVE="$(jq -r '.replay_live // false' $CONFIG)"
+export REPLAY_TOPIC_PREFIX="$(jq -r '.replay_topic_prefix // ""' $CONFIG)"
+export READ_API_PORT="$(jq -r '.read_api_port // 0' $CONFIG)"
+export READ_API_HOST="$(jq -r '.read_api_host // "127.0.0.1"' $CONFIG)"
+export READ_API_HISTORY="$(jq -r '.read_api_history // 720' $CONFIG)"
+export WATCHDOG="$(jq -r 'if .watchdog == false then "false" else "true" end' $CONFIG)"
+export WATCHDOG_BROWSER_MB="$(jq -r '.watchdog_browser_mb // 600' $CONFIG)"
+export WATCHDOG_PYTHON_MB="$(jq -r '.watchdog_python_mb // 400' $CONFIG)"
+export WATCHDOG_STALE_SECONDS="$(jq -r '.watchdog_stale_seconds // 600' $CONFIG)"
+export WATCHDOG_ERROR_RATE="$(jq -r '.watchdog_error_rate // 0.5' $CONFIG)"
+export REQUEST_TIMEOUT="$(jq -r '.request_timeout // 10' $CONFIG)"
+export REQUEST_MAX_IN_FLIGHT="$(jq -r '.request_max_in_flight // 1' $CONFIG)"
+export SYSTEMS="$(jq -c '.systems // []' $CONFIG)"
 
 # Ensure data directory exists
 mkdir -p /data/power_data
@@ -0,0 +1,123 @@
+# scheduler.py
+# Deadline-driven job scheduler. Interval jobs run on a fixed monotonic grid so
+# they never drift; daily jobs are pinned to wall-clock times. The run loop
+# sleeps until the nearest deadline instead of polling the clock.
+import random, threading, time
+from datetime import datetime, timedelta
+
+# What to do when the loop wakes up more than one interval late:
+#   "skip"    - run once, then realign to the next future grid point
+#   "catchup" - run once per missed tick (up to MAX_CATCHUP) back to back
+POLICIES = ("skip", "catchup")
+MAX_CATCHUP = 5
+
+def parse_hhmm(text):
+    """'02:30' -> (2, 30); ValueError unless it is a valid HH:MM time of day."""
+    try:
+        hour, minute = (int(x) for x in text.strip().split(":"))
+    except ValueError:
+        raise ValueError(f"{text!r} is not an HH:MM time")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"{text!r} is not an HH:MM time")
+    return hour, minute
+
+class Job:
+    def __init__(self, name, fn, interval=None, at=None, jitter=0.0, policy="skip"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown schedule policy {policy!r}")
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.at = at
+        self.jitter = jitter
+        self.policy = policy
+        self.grid = None        # undelayed monotonic deadline
+        self.deadline = None    # grid plus jitter; when the job actually fires
+        self.runs = 0
+        self.missed = 0
+        self.last_lateness = 0.0
+
+class Scheduler:
+    """Runs interval and daily jobs in the calling thread."""
+    def __init__(self, clock=time.monotonic, wall=datetime.now):
+        self.clock = clock
+        self.wall = wall
+        self.jobs = []
+        self.stop_event = threading.Event()
+
+    def every(self, seconds, fn, name=None, jitter=0.0, policy="skip", run_now=False):
+        job = Job(name or fn.__name__, fn, interval=float(seconds), jitter=jitter, policy=policy)
+        job.grid = self.clock() + (0 if run_now else job.interval)
+        job.deadline = job.grid + self._jitter(job)
+        self.jobs.append(job)
+        return job
+
+    def daily_at(self, hhmm, fn, name=None):
+        hour, minute = parse_hhmm(hhmm)
+        job = Job(name or f"{fn.__name__}@{hhmm}", fn, at=(hour, minute))
+        self._schedule_daily(job)
+        self.jobs.append(job)
+        return job
+
+    def _jitter(self, job):
+        return random.uniform(0, job.jitter) if job.jitter else 0.0
+
+    def _schedule_daily(self, job, just_ran=False):
+        now = self.wall()
+        target = now.replace(hour=job.at[0], minute=job.at[1], second=0, microsecond=0)
+        # Monotonic and wall clocks can disagree slightly; never fire twice for one day
+        slack = timedelta(minutes=1) if just_ran else timedelta(0)
+        if target <= now + slack:
+            target += timedelta(days=1)
+        job.grid = job.deadline = self.clock() + (target - now).total_seconds()
+
+    def _advance(self, job, now):
+        """Move an interval job to its next deadline; return how many extra runs are owed."""
+        job.grid += job.interval
+        owed = 0
+        if job.grid <= now:
+            behind = int((now - job.grid) // job.interval) + 1
+            job.missed += behind
+            if job.policy == "catchup":
+                owed = min(behind, MAX_CATCHUP)
+            job.grid += behind * job.interval
+        job.deadline = job.grid + self._jitter(job)
+        return owed
+
+    def _run(self, job):
+        try:
+            job.fn()
+        except Exception as e:
+            print(f"Scheduled job {job.name} failed: {e}")
+        job.runs += 1
+
+    def run_pending(self):
+        """Run every job whose deadline has passed; return seconds until the next one."""
+        for job in sorted(self.jobs, key=lambda j: j.deadline):
+            now = self.clock()
+            if job.deadline > now:
+                continue
+            job.last_lateness = now - job.deadline
+            self._run(job)
+            if job.interval is None:
+                self._schedule_daily(job, just_ran=True)
+                continue
+            for _ in range(self._advance(job, self.clock())):
+                self._run(job)
+        if not self.jobs:
+            return None
+        return max(0.0, min(j.deadline for j in self.jobs) - self.clock())
+
+    def run(self, wait=None):
+        """Block, running jobs as they come due, until stop() is called.
+
+        wait(seconds) sleeps between jobs; pass one that keeps an event loop
+        turning (e.g. Playwright's) so its callbacks run as events arrive.
+        """
+        wait = wait or self.stop_event.wait
+        while not self.stop_event.is_set():
+            delay = self.run_pending()
+            wait(delay)
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,251 @@
+# spool.py
+# Store-and-forward spool in front of mqtt_client.publish. While the broker is
+# unreachable (or older messages are still waiting) publishes are appended to
+# segment files on disk; once the connection is back they are replayed in
+# order, in QoS 1 batches, and the read cursor is persisted so a restart
+# resumes where replay left off. The spool is capped in size: when it grows
+# past max_bytes the oldest segments are dropped.
+import json, os, struct, threading
+import paho.mqtt.client as mqtt
+import metrics
+
+LENGTH = struct.Struct("<I")
+
+PUBLISH_SECONDS = metrics.Histogram("bytewatt_mqtt_publish_seconds", "Time to hand a message to MQTT or the spool")
+SPOOLED = metrics.Counter("bytewatt_mqtt_spooled_total", "Messages written to the spool")
+REPLAYED = metrics.Counter("bytewatt_mqtt_replayed_total", "Spooled messages delivered on reconnect")
+DROPPED = metrics.Counter("bytewatt_mqtt_spool_dropped_total", "Spooled messages dropped when the spool was full")
+metrics.Gauge("bytewatt_mqtt_spool_depth", "Messages waiting in the spool",
+              fn=lambda: {(): sum(s.queued for s in SPOOLS)})
+SPOOLS = []
+
+class Spool:
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024, segment_bytes=1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.cursor = self._load_cursor()
+        self.segments = self._scan()
+        self.writer = None
+        self.counts = {seq: self._count(seq) for seq in self.segments}   # records per segment
+        self.queued = self._queued()
+        self.size = sum(os.path.getsize(self._path(s)) for s in self.segments)
+        self.dropped = 0
+        SPOOLS.append(self)
+
+    # ─── Files ─────────────────────────────────────────────────────────────────
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:08d}.spl")
+
+    def _scan(self):
+        seqs = sorted(int(n[:-4]) for n in os.listdir(self.directory) if n.endswith(".spl"))
+        # Segments wholly before the cursor were replayed but not yet removed
+        for seq in [s for s in seqs if s < self.cursor[0]]:
+            os.remove(self._path(seq))
+        return [s for s in seqs if s >= self.cursor[0]]
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, "cursor")) as f:
+                c = json.load(f)
+            return (c["seq"], c["offset"])
+        except (OSError, ValueError, KeyError):
+            return (0, 0)
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, "cursor")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"seq": self.cursor[0], "offset": self.cursor[1]}, f)
+        os.replace(path + ".tmp", path)
+
+    def _records(self, seq, offset=0, limit=None):
+        """(end offset, record) pairs from a segment, starting at offset."""
+        out = []
+        try:
+            with open(self._path(seq), "rb") as f:
+                f.seek(offset)
+                while limit is None or len(out) < limit:
+                    head = f.read(LENGTH.size)
+                    if len(head) < LENGTH.size:
+                        break
+                    body = f.read(LENGTH.unpack(head)[0])
+                    if len(body) < LENGTH.unpack(head)[0]:
+                        break   # torn write at the tail
+                    out.append((f.tell(), json.loads(body)))
+        except FileNotFoundError:
+            pass
+        return out
+
+    def _count(self, seq, offset=0):
+        """Whole records in a segment from offset on, without decoding them."""
+        n = 0
+        try:
+            with open(self._path(seq), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                f.seek(offset)
+                while True:
+                    head = f.read(LENGTH.size)
+                    if len(head) < LENGTH.size:
+                        break
+                    end = f.tell() + LENGTH.unpack(head)[0]
+                    if end > size:
+                        break   # torn write at the tail
+                    f.seek(end)
+                    n += 1
+        except FileNotFoundError:
+            pass
+        return n
+
+    def _queued(self):
+        """Records still on disk past the cursor."""
+        return sum(self._count(seq, self.cursor[1]) if seq == self.cursor[0] else self.counts[seq]
+                   for seq in self.segments)
+
+    # ─── Writing ───────────────────────────────────────────────────────────────
+    def append(self, topic, payload, retain):
+        body = json.dumps({"t": topic, "p": payload, "r": retain}).encode()
+        with self.lock:
+            if self.writer is None or self.writer.tell() >= self.segment_bytes:
+                self._roll()
+            self.writer.write(LENGTH.pack(len(body)) + body)
+            self.writer.flush()
+            self.counts[self.segments[-1]] += 1
+            self.queued += 1
+            self.size += LENGTH.size + len(body)
+            while len(self.segments) > 1 and self.size > self.max_bytes:
+                self._drop_oldest()
+
+    def _roll(self):
+        if self.writer:
+            self.writer.close()
+        if self.segments:
+            seq = self.segments[-1] + 1
+        else:
+            # Fresh start after a full drain: begin a new segment past the cursor
+            seq = self.cursor[0] + 1
+            self.cursor = (seq, 0)
+            self._save_cursor()
+        self.segments.append(seq)
+        self.counts[seq] = 0
+        self.writer = open(self._path(seq), "ab")
+
+    def _remove(self, seq):
+        path = self._path(seq)
+        self.size -= os.path.getsize(path)
+        os.remove(path)
+        self.counts.pop(seq, None)
+
+    def _drop_oldest(self):
+        seq = self.segments.pop(0)
+        lost = self._count(seq, self.cursor[1]) if seq == self.cursor[0] else self.counts[seq]
+        self._remove(seq)
+        if self.cursor[0] <= seq:
+            self.cursor = (self.segments[0], 0)
+            self._save_cursor()
+        self.queued = self._queued()
+        self.dropped += lost
+        DROPPED.inc(lost)
+        print(f"MQTT spool full, dropped {lost} oldest messages")
+
+    # ─── Replay ────────────────────────────────────────────────────────────────
+    def next_batch(self, limit):
+        """Up to limit queued records from the cursor, with the cursor after each."""
+        with self.lock:
+            out = []
+            for seq in list(self.segments):
+                offset = self.cursor[1] if seq == self.cursor[0] else 0
+                for end, rec in self._records(seq, offset, limit - len(out)):
+                    out.append(((seq, end), rec))
+                if len(out) >= limit:
+                    break
+            return out
+
+    def commit(self, cursor):
+        """Mark everything up to cursor as delivered."""
+        with self.lock:
+            # A batch whose segment was dropped for room while it was in
+            # flight, or one behind the cursor, has nothing left to mark
+            if not self.segments or cursor[0] < self.segments[0] or cursor <= self.cursor:
+                return
+            self.cursor = cursor
+            # Remove fully replayed segments, but never the one being written
+            while len(self.segments) > 1 and self.segments[0] < cursor[0]:
+                self._remove(self.segments.pop(0))
+            self.queued = self._queued()
+            self._save_cursor()
+
+    def close(self):
+        with self.lock:
+            if self.writer:
+                self.writer.close()
+                self.writer = None
+
+class SpooledClient:
+    """Wraps a paho client so publish() goes through the spool when needed.
+
+    Everything other than publish is passed straight through to the client.
+    """
+    def __init__(self, client, spool, batch=50, ack_timeout=10):
+        self.client = client
+        self.spool = spool
+        self.batch = batch
+        self.ack_timeout = ack_timeout
+        self.wake = threading.Event()
+        threading.Thread(target=self._replay_worker, daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        with PUBLISH_SECONDS.time():
+            return self._publish(topic, payload, qos, retain)
+
+    def _publish(self, topic, payload, qos, retain):
+        # Keep ordering: nothing goes direct while older messages wait on disk
+        with self.spool.lock:
+            direct = self.spool.queued == 0 and self.client.is_connected()
+        if direct:
+            info = self.client.publish(topic, payload, qos=qos, retain=retain)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                return info
+        self.spool.append(topic, payload, retain)
+        SPOOLED.inc()
+        if self.client.is_connected():
+            self.wake.set()
+        return None
+
+    def resume(self):
+        """Wake the replay worker (called when the broker connection comes up)."""
+        self.wake.set()
+
+    def _replay_worker(self):
+        while True:
+            # The timeout covers wake-ups lost to connect/publish races
+            self.wake.wait(5)
+            self.wake.clear()
+            if self.spool.queued and self.client.is_connected():
+                self.replay()
+
+    def replay(self):
+        """Send spooled messages in order until drained or the connection drops."""
+        sent = 0
+        while self.client.is_connected():
+            batch = self.spool.next_batch(self.batch)
+            if not batch:
+                break
+            infos = [self.client.publish(rec["t"], rec["p"], qos=1, retain=rec["r"])
+                     for _, rec in batch]
+            try:
+                for info in infos:
+                    info.wait_for_publish(self.ack_timeout)
+            except (RuntimeError, ValueError):
+                break
+            if not all(info.is_published() for info in infos):
+                break
+            self.spool.commit(batch[-1][0])
+            REPLAYED.inc(len(batch))
+            sent += len(batch)
+        if sent:
+            print(f"Replayed {sent} spooled MQTT messages")
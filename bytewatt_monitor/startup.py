@@ -0,0 +1,76 @@
+# startup.py
+# Timing of a cold start, phase by phase. Phases run on different threads
+# and overlap, so each is reported with its start and end relative to the
+# process start, plus a milestone for the first data handled.
+import threading, time
+from contextlib import contextmanager
+import metrics
+
+PHASE_SECONDS = metrics.Gauge("bytewatt_startup_phase_seconds", "Duration of each phase of the last start",
+                              ["phase"])
+
+class StartupTimer:
+    def __init__(self, t0=None, clock=time.monotonic):
+        self.clock = clock
+        self.t0 = t0 if t0 is not None else clock()
+        self.lock = threading.Lock()
+        self.phases = {}     # name -> [start, end or None], seconds since t0
+        self.reported = False
+
+    def record(self, name, start, end):
+        with self.lock:
+            self.phases[name] = [start - self.t0, end - self.t0]
+        PHASE_SECONDS.set(round(end - start, 3), phase=name)
+
+    def begin(self, name):
+        with self.lock:
+            self.phases.setdefault(name, [self.clock() - self.t0, None])
+
+    def end(self, name):
+        """Close a phase; later calls (e.g. on reconnects) are ignored."""
+        with self.lock:
+            phase = self.phases.get(name)
+            if not phase or phase[1] is not None:
+                return
+            phase[1] = self.clock() - self.t0
+        PHASE_SECONDS.set(round(phase[1] - phase[0], 3), phase=name)
+
+    @contextmanager
+    def phase(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def mark(self, name):
+        """A milestone: a phase running from process start to now."""
+        with self.lock:
+            if name in self.phases:
+                return
+            self.phases[name] = [0.0, None]
+        self.end(name)
+
+    def report(self):
+        with self.lock:
+            # In order of completion, so milestones sit among the phases they follow
+            phases = sorted(self.phases.items(),
+                            key=lambda item: item[1][1] if item[1][1] is not None else float("inf"))
+        lines = []
+        for name, (start, end) in phases:
+            if end is None:
+                lines.append(f"  {name:<16} {start:7.2f}s ->  (still running)")
+            else:
+                lines.append(f"  {name:<16} {start:7.2f}s -> {end:7.2f}s  {end - start:7.2f}s")
+        return lines
+
+    def finish(self, name="first_data"):
+        """Mark the first data and print the breakdown, once per start."""
+        with self.lock:
+            if self.reported:
+                return
+            self.reported = True
+        self.mark(name)
+        print(f"Startup timing (first data after {self.phases[name][1]:.2f}s):")
+        for line in self.report():
+            print(line)
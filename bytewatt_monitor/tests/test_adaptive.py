@@ -0,0 +1,71 @@
+from datetime import datetime
+from adaptive import AdaptiveInterval, parse_hours
+
+def at(hour):
+    return lambda: datetime(2026, 6, 1, hour, 30)
+
+def sample(pv=1000, load=500, battery=200, grid=0):
+    return {"pv_production": pv, "load": load, "battery": battery, "grid": grid}
+
+def controller(hour=12, **kwargs):
+    return AdaptiveInterval(30, min_s=10, max_s=300, fast_delta=300, slow_delta=50,
+                            clock=at(hour), **kwargs)
+
+def test_fast_changes_poll_at_the_minimum():
+    a = controller()
+    a.record("SN", sample(load=500))
+    a.record("SN", sample(load=1500))
+    assert a.next_interval() == 10
+    a.record("SN", sample(load=1600))         # moderate change: back to base
+    assert a.next_interval() == 30
+
+def test_steady_readings_stretch_only_to_base_while_active():
+    a = controller()
+    a.record("SN", sample())
+    a.record("SN", sample(load=510))
+    assert [a.next_interval() for _ in range(3)] == [30, 30, 30]
+
+def test_idle_system_stretches_to_the_maximum():
+    a = controller()
+    a.record("SN", sample(pv=0, battery=10))
+    a.record("SN", sample(pv=0, battery=20))
+    assert [a.next_interval() for _ in range(3)] == [45, 67.5, 101.25]
+    for _ in range(10):
+        a.next_interval()
+    assert a.interval == 300
+
+def test_idle_needs_every_system_idle():
+    a = controller()
+    a.record("A", sample(pv=0, battery=10))
+    a.record("B", sample(pv=800))
+    assert a.next_interval() == 30
+
+def test_quiet_hours_wrap_midnight():
+    assert parse_hours("23-6") == (23, 6)
+    assert parse_hours("") is None
+    for hour, quiet in ((22, False), (23, True), (0, True), (5, True), (6, False), (12, False)):
+        assert controller(hour, quiet_hours=(23, 6)).in_quiet_hours() is quiet
+    assert controller(3, quiet_hours=(1, 5)).in_quiet_hours()
+    assert not controller(5, quiet_hours=(1, 5)).in_quiet_hours()
+
+def test_quiet_hours_stretch_an_active_system():
+    a = controller(2, quiet_hours=(23, 6))
+    a.record("SN", sample())
+    assert a.next_interval() == 45
+
+def test_errors_back_off_up_to_the_cap_and_reset_on_a_good_sample():
+    a = controller(max_backoff_s=200)
+    a.record_error()
+    assert [a.next_interval() for _ in range(4)] == [60, 120, 240, 300]   # cap below max_s is raised to it
+    a.record("SN", sample())
+    assert a.errors == 0
+    assert a.next_interval() == 30
+
+def test_backoff_cap_above_the_normal_maximum():
+    a = controller(max_backoff_s=900)
+    a.record_error(rate_limited=True)
+    assert a.errors == 2
+    intervals = [a.next_interval() for _ in range(6)]
+    assert intervals == [60, 120, 240, 480, 900, 900]
+    a.record("SN", sample())
+    assert a.next_interval() == 30
@@ -0,0 +1,59 @@
+import os
+from datetime import datetime, timedelta
+from archive import ResponseArchive
+
+def noon(days_ago=0):
+    day = datetime.now() - timedelta(days=days_ago)
+    return day.replace(hour=12, minute=0, second=0, microsecond=0).timestamp()
+
+def fill(archive, start, count, step=10):
+    for i in range(count):
+        archive.write(f"http://cloud/api/{i}", 200, b'{"n":%d}' % i, ts=start + step * i)
+
+def test_read_range_across_blocks(tmp_path):
+    archive = ResponseArchive(str(tmp_path), block_records=4)
+    start = noon(1)
+    fill(archive, start, 10)                  # two full blocks, two records still buffered
+    recs = list(archive.read(start + 25, start + 75))
+    assert [r["url"] for r in recs] == [f"http://cloud/api/{i}" for i in range(3, 8)]
+    assert recs[0]["body"] == '{"n":3}' and recs[0]["status"] == 200
+    assert len(list(archive.read(start, start + 100))) == 10
+
+def test_read_spans_days(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    older, newer = noon(2), noon(1)
+    fill(archive, older, 3)
+    fill(archive, newer, 3)
+    assert len(list(archive.read(older, newer + 100))) == 6
+    assert len(os.listdir(tmp_path)) == 4     # data and index per day
+
+def test_nearest(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    start = noon(1)
+    fill(archive, start, 5, step=60)
+    assert archive.nearest(start + 100)["url"] == "http://cloud/api/2"
+    assert archive.nearest(start - 3600)["url"] == "http://cloud/api/0"
+
+def test_survives_a_torn_index(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    start = noon(1)
+    fill(archive, start, 3)
+    archive.flush()
+    day = datetime.fromtimestamp(start).strftime("%Y%m%d")
+    with open(tmp_path / f"{day}.idx", "ab") as f:
+        f.write(b"\x01\x02\x03")              # half-written entry
+    archive = ResponseArchive(str(tmp_path))
+    assert len(list(archive.read(start, start + 100))) == 3
+    fill(archive, start + 30, 3)
+    archive.flush()
+    recs = list(ResponseArchive(str(tmp_path)).read(start, start + 100))
+    assert [r["body"] for r in recs] == ['{"n":%d}' % i for i in (0, 1, 2, 0, 1, 2)]
+
+def test_prune(tmp_path):
+    archive = ResponseArchive(str(tmp_path), retention_days=30)
+    fill(archive, noon(40), 1)
+    fill(archive, noon(1), 1)
+    archive.flush()
+    archive.prune()
+    assert sorted(os.listdir(tmp_path)) == [f"{datetime.fromtimestamp(noon(1)):%Y%m%d}.{ext}"
+                                           for ext in ("idx", "ndjson.gz")]
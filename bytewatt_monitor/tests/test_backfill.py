@@ -0,0 +1,114 @@
+from datetime import date, timedelta
+import pytest
+from backfill import Backfill, SessionRejected, fetch_statics_for_day, summary_day
+from direct import DirectSession
+from fakecloud import FakeCloud
+
+STATICS = "/api/report/energy/getStaticsByDay?sysSn=SN"
+SYSTEM = {"sys_sn": "SN", "name": "test"}
+YESTERDAY = (date.today() - timedelta(days=1)).strftime("%Y%m%d")
+
+def auth_error(resp):
+    return resp.status in (401, 403)
+
+def logged_in(cloud):
+    session = DirectSession(cloud.url)
+    session.set_auth({"headers": {"Authorization": f"Bearer {cloud.issue_token()}"}})
+    return session
+
+@pytest.fixture
+def serving():
+    """Start a fake cloud answering getStaticsByDay with the given bodies in turn."""
+    clouds = []
+
+    def start(*bodies):
+        c = FakeCloud(fixtures={STATICS.split("?")[0]: [{"code": 200, "data": b} for b in bodies]}).start()
+        clouds.append(c)
+        return logged_in(c)
+
+    yield start
+    for c in clouds:
+        c.stop()
+
+def test_cloud_answers_for_the_requested_day(cloud):
+    session = DirectSession(cloud.url)
+    assert session.get(STATICS).status == 401
+    session.set_auth({"headers": {"Authorization": f"Bearer {cloud.issue_token()}"}})
+    today = session.get(STATICS).json()["data"]
+    past = session.get(STATICS + "&queryDate=2026-01-02").json()["data"]
+    assert today["queryDate"] == date.today().isoformat()
+    assert past["queryDate"] == "2026-01-02"
+    assert past["epv"] != today["epv"]
+
+def test_fetches_each_missing_day_once(tmp_path, cloud):
+    session = DirectSession(cloud.url)
+    session.set_auth({"headers": {"Authorization": f"Bearer {cloud.issue_token()}"}})
+    saved = {}
+    days = [(date.today() - timedelta(days=n)).strftime("%Y%m%d") for n in range(1, 6)]
+    broken = days[2]
+
+    def fetch(system, day):
+        if day == broken:
+            raise RuntimeError("cloud hiccup")
+        return session.get(STATICS + f"&queryDate={day[:4]}-{day[4:6]}-{day[6:]}").json()["data"]
+
+    index = str(tmp_path / "index.json")
+    backfill = Backfill(index, lambda s, d, data: saved.__setitem__(d, data), lambda s, d: d in saved)
+    assert [day for _, day in backfill.missing([SYSTEM], 5)] == days
+    assert backfill.run([SYSTEM], 5, fetch) == 4
+    assert saved[days[0]]["queryDate"] == f"{days[0][:4]}-{days[0][4:6]}-{days[0][6:]}"
+    assert backfill.index["SN"][broken] == "failed:1"
+    # Only the failed day is tried again, by this run or after a restart
+    assert [day for _, day in backfill.missing([SYSTEM], 5)] == [broken]
+    assert [day for _, day in Backfill(index, None, lambda s, d: False).missing([SYSTEM], 5)] == [broken]
+
+def test_gives_up_on_a_day_after_max_attempts(tmp_path):
+    def fetch(system, day):
+        raise RuntimeError("summary does not say which day it covers")
+
+    index = str(tmp_path / "index.json")
+    day = (date.today() - timedelta(days=1)).strftime("%Y%m%d")
+    for n in range(1, 3):
+        backfill = Backfill(index, None, lambda s, d: False, max_attempts=3)
+        assert backfill.run([SYSTEM], 1, fetch) == 0
+        assert backfill.index["SN"][day] == f"failed:{n}"
+    backfill.run([SYSTEM], 1, fetch)
+    assert backfill.index["SN"][day] == "gave_up"
+    assert Backfill(index, None, lambda s, d: False).missing([SYSTEM], 1) == []
+
+def test_rejected_session_does_not_count_as_an_attempt(tmp_path):
+    def fetch(system, day):
+        raise SessionRejected()
+
+    index = str(tmp_path / "index.json")
+    for _ in range(3):
+        backfill = Backfill(index, None, lambda s, d: False, max_attempts=2)
+        assert backfill.run([SYSTEM], 2, fetch) == 0
+    assert backfill.index == {}
+    assert len(backfill.missing([SYSTEM], 2)) == 2
+
+def test_summary_day_reads_the_common_date_fields():
+    assert summary_day({"queryDate": "2026-01-02"}) == "20260102"
+    assert summary_day({"statDate": "2026/01/02 00:00:00"}) == "20260102"
+    assert summary_day({"day": "2026-01-02"}, date_param="day") == "20260102"
+    assert summary_day({"epv": 1, "date": ""}) is None
+
+def test_fetch_gets_the_requested_day(cloud):
+    stats = fetch_statics_for_day(logged_in(cloud), STATICS, YESTERDAY, auth_error)
+    assert summary_day(stats) == YESTERDAY
+    with pytest.raises(SessionRejected):
+        fetch_statics_for_day(DirectSession(cloud.url), STATICS, YESTERDAY, auth_error)
+
+def test_fetch_rejects_a_cloud_that_ignores_the_date(serving):
+    session = serving({"epv": 12.45, "queryDate": date.today().isoformat()})
+    with pytest.raises(RuntimeError, match="got the summary for"):
+        fetch_statics_for_day(session, STATICS, YESTERDAY, auth_error)
+
+def test_fetch_rejects_an_undated_summary_equal_to_today(serving):
+    session = serving({"epv": 12.45})
+    with pytest.raises(RuntimeError, match="same as today's"):
+        fetch_statics_for_day(session, STATICS, YESTERDAY, auth_error)
+
+def test_fetch_accepts_an_undated_summary_that_differs_from_today(serving):
+    session = serving({"epv": 8.1}, {"epv": 12.45})
+    assert fetch_statics_for_day(session, STATICS, YESTERDAY, auth_error) == {"epv": 8.1}
@@ -0,0 +1,29 @@
+from catalog import CATALOG, GROUP_KEYS, extract, diff_configs
+
+def test_extract_reads_api_keys_and_defaults_missing():
+    stats = extract("power_data", {"pvPower": 2350, "powerLoad": 780, "soc": 64.0, "other": 1})
+    assert stats == {"pv_production": 2350, "load": 780, "battery": 0, "grid": 0, "soc": 64.0}
+
+def test_local_groups_have_no_api_sources():
+    assert all(s["source"] is None for s in CATALOG["local_energy"]["sensors"])
+    assert extract("local_energy", {"pv_kwh": 1}) == {}
+    assert GROUP_KEYS["power_data"] == "power_stats"
+
+def test_diff_publishes_only_changes_and_removes_dropped():
+    first = {"a/config": '{"x":1}', "b/config": '{"y":1}'}
+    hashes, changed, removed = diff_configs(first, {})
+    assert changed == ["a/config", "b/config"] and removed == []
+
+    _, changed, removed = diff_configs(first, hashes)
+    assert changed == [] and removed == []
+
+    second = {"a/config": '{"x":2}', "c/config": '{"z":1}'}
+    new_hashes, changed, removed = diff_configs(second, hashes)
+    assert changed == ["a/config", "c/config"]
+    assert removed == ["b/config"]
+    assert set(new_hashes) == {"a/config", "c/config"}
+
+def test_diff_force_republishes_everything():
+    configs = {"a/config": "{}"}
+    hashes, _, _ = diff_configs(configs, {})
+    assert diff_configs(configs, hashes, force=True)[1] == ["a/config"]
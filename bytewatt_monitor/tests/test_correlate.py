@@ -0,0 +1,34 @@
+from correlate import RequestTracker, REQUEST_SECONDS, TIMEOUTS, STALE, SKIPPED
+
+def tracker(clock, **kwargs):
+    return RequestTracker(deadline=10, clock=clock, **kwargs)
+
+def test_times_answered_requests(clock):
+    t = tracker(clock)
+    key = ("SN", "timed")
+    seq = t.next_cycle()
+    assert t.begin(key, seq)
+    clock.now = 2.5
+    assert t.complete(key, seq)
+    assert REQUEST_SECONDS.mean(endpoint="timed") == 2.5
+    assert TIMEOUTS.get(endpoint="timed") == 0
+
+def test_drops_responses_older_than_one_handled(clock):
+    t = tracker(clock, max_in_flight=2)
+    key = ("SN", "stale")
+    first, second = t.next_cycle(), t.next_cycle()
+    assert t.begin(key, first) and t.begin(key, second)
+    assert t.complete(key, second)
+    assert not t.complete(key, first)
+    assert STALE.get(endpoint="stale") == 1
+    assert t.complete(key, None)     # untagged responses always pass
+
+def test_in_flight_limit_and_deadline(clock):
+    t = tracker(clock)
+    key = ("SN", "slow")
+    assert t.begin(key, t.next_cycle())
+    assert not t.begin(key, t.next_cycle())
+    assert SKIPPED.get(endpoint="slow") == 1
+    clock.now = 11
+    assert t.begin(key, t.next_cycle())   # the overdue request was expired
+    assert TIMEOUTS.get(endpoint="slow") == 1
@@ -0,0 +1,46 @@
+from deadband import FieldPublisher
+
+def test_absolute_and_relative_bands(clock, mqtt_client):
+    pub = FieldPublisher(abs_band=10, max_age=300, overrides={"soc": {"abs": 0, "rel": 0.05}}, clock=clock)
+    for value in (100, 105, 111, 115):
+        pub.offer(mqtt_client, "t/power_data/load", value)
+    for value in (50, 52, 53):
+        pub.offer(mqtt_client, "t/power_data/soc", value)
+    assert mqtt_client.sent == [("t/power_data/load", "100"), ("t/power_data/load", "111"),
+                                ("t/power_data/soc", "50"), ("t/power_data/soc", "53")]
+    assert pub.suppressed == 3
+
+def test_heartbeat_after_max_age(clock, mqtt_client):
+    pub = FieldPublisher(abs_band=10, max_age=300, clock=clock)
+    pub.offer(mqtt_client, "t/g/f", 1)
+    clock.now = 299
+    assert not pub.offer(mqtt_client, "t/g/f", 1)
+    clock.now = 300
+    assert pub.offer(mqtt_client, "t/g/f", 1)
+    assert len(mqtt_client.sent) == 2
+
+def test_no_band_sends_every_change_and_non_numbers(clock, mqtt_client):
+    pub = FieldPublisher(clock=clock)
+    for value in (1, 1, 2, "on", "on", "off"):
+        pub.offer(mqtt_client, "t/g/f", value)
+    assert [p for _, p in mqtt_client.sent] == ["1", "2", "on", "off"]
+
+def test_batching_coalesces_until_flush(clock, mqtt_client):
+    pub = FieldPublisher(abs_band=1, batch_seconds=5, clock=clock)
+    pub.offer(mqtt_client, "t/g/a", 10)
+    pub.offer(mqtt_client, "t/g/a", 20)
+    pub.offer(mqtt_client, "t/g/b", 5)
+    assert mqtt_client.sent == []
+    assert pub.flush(mqtt_client) == 2
+    assert sorted(mqtt_client.sent) == [("t/g/a", "20"), ("t/g/b", "5")]
+    # A value back inside the band of what was sent drops a held change
+    pub.offer(mqtt_client, "t/g/a", 30)
+    pub.offer(mqtt_client, "t/g/a", 20.5)
+    assert pub.flush(mqtt_client) == 0
+
+def test_zero_max_age_turns_heartbeats_off(clock, mqtt_client):
+    pub = FieldPublisher(abs_band=100, max_age=0, clock=clock)
+    for value in range(1000, 1005):
+        clock.now += 60
+        pub.offer(mqtt_client, "t/power_data/load", value)
+    assert mqtt_client.sent == [("t/power_data/load", "1000")]
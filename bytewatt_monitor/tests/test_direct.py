@@ -0,0 +1,104 @@
+import json, time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from correlate import RequestTracker
+from direct import DirectSession
+from fakecloud import FakeCloud, FIXTURES
+
+POWER = "/api/report/energyStorage/getLastPowerData"
+
+@pytest.fixture
+def direct(run, tmp_path, monkeypatch):
+    """Direct-mode polling state with capture_session logging straight into the given cloud."""
+    monkeypatch.setattr(run, "SESSION_FILE", str(tmp_path / "session.json"))
+    monkeypatch.setattr(run, "tracker", RequestTracker(deadline=10))
+    run.session_expired.clear()
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown()
+    run.session_expired.clear()
+
+def stub_login(run, cloud, monkeypatch):
+    logins = []
+
+    def capture_session():
+        auth = {"headers": {"Authorization": f"Bearer {cloud.issue_token()}"}, "cookies": []}
+        run.save_session(auth)
+        logins.append(auth)
+        return auth
+
+    monkeypatch.setattr(run, "capture_session", capture_session)
+    return logins
+
+def power_updates(mqtt_client):
+    return [json.loads(p) for t, p in mqtt_client.sent if t == "bytewatt/power_data"]
+
+def poll_and_wait(run, session, executor, mqtt_client):
+    run.direct_poll(session, executor, mqtt_client, ["power"])
+    deadline = time.monotonic() + 5
+    while run.tracker.pending.get(("SN", "power")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def saved_token(run):
+    with open(run.SESSION_FILE) as f:
+        return json.load(f)["headers"]["Authorization"]
+
+def test_logs_in_again_after_the_cloud_expires_the_session(run, direct, cloud, mqtt_client, monkeypatch):
+    logins = stub_login(run, cloud, monkeypatch)
+    session = DirectSession(cloud.url)
+    session.set_auth(run.capture_session())
+    poll_and_wait(run, session, direct, mqtt_client)
+    assert power_updates(mqtt_client)[0]["power_stats"]["pv_production"] == 2350
+
+    cloud.expire_sessions()
+    poll_and_wait(run, session, direct, mqtt_client)
+    assert run.session_expired.is_set()
+    assert len(power_updates(mqtt_client)) == 1
+
+    poll_and_wait(run, session, direct, mqtt_client)
+    assert len(logins) == 2
+    assert not run.session_expired.is_set()
+    assert saved_token(run) == logins[-1]["headers"]["Authorization"]
+    assert len(power_updates(mqtt_client)) == 2
+
+def test_an_auth_code_in_the_body_counts_as_expiry(run, direct, mqtt_client, monkeypatch):
+    ok = {"code": 200, "msg": "Success", "data": FIXTURES[POWER]}
+    cloud = FakeCloud(username="user", password="secret",
+                      fixtures={POWER: [ok, {"code": 401, "msg": "token expired"}, ok]}).start()
+    try:
+        logins = stub_login(run, cloud, monkeypatch)
+        session = DirectSession(cloud.url)
+        session.set_auth(run.capture_session())
+        for _ in range(2):
+            poll_and_wait(run, session, direct, mqtt_client)
+        assert run.session_expired.is_set()
+        assert len(power_updates(mqtt_client)) == 1     # the rejected poll published nothing
+        poll_and_wait(run, session, direct, mqtt_client)
+        assert len(logins) == 2
+        assert len(power_updates(mqtt_client)) == 2
+    finally:
+        cloud.stop()
+
+def test_startup_login_keeps_retrying_with_backoff(run):
+    attempts, sleeps = iter([None, ConnectionError("cloud down"), None, {"headers": {}}]), []
+
+    def login():
+        result = next(attempts)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    auth = run.login_with_retry(login, first_delay=30, max_delay=100, sleep=sleeps.append)
+    assert auth == {"headers": {}}
+    assert sleeps == [30, 60, 100]
+
+def test_unreachable_cloud_tells_the_watchdog(run, direct, clock, mqtt_client, monkeypatch):
+    from watchdog import Watchdog
+    dog = Watchdog(["session", "restart"], stale_s=600, clock=clock)
+    monkeypatch.setattr(run, "watchdog", dog)
+    cloud = FakeCloud().start()
+    url = cloud.url
+    cloud.stop()                                # nothing listens there any more
+    clock.now = 5
+    poll_and_wait(run, DirectSession(url, timeout=1), direct, mqtt_client)
+    assert dog.offline()
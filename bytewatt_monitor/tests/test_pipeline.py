@@ -0,0 +1,99 @@
+import threading, time
+import pytest
+from pipeline import PublishQueue, Recorder
+
+SYSTEM = {"sys_sn": "SN"}
+
+def fill(q, n):
+    return [q.put(SYSTEM, "power_data", {"n": i}, {}) for i in range(n)]
+
+def queued(q):
+    return [s.payload["n"] for s in q.queue]
+
+def test_drop_oldest_keeps_the_freshest():
+    q = PublishQueue(lambda s: None, maxsize=2, policy="drop_oldest")   # worker not started
+    assert fill(q, 4) == [True] * 4
+    assert queued(q) == [2, 3]
+    assert q.high_water == 2
+
+def test_drop_newest_refuses_the_newcomer():
+    q = PublishQueue(lambda s: None, maxsize=2, policy="drop_newest")
+    assert fill(q, 3) == [True, True, False]
+    assert queued(q) == [0, 1]
+
+def test_block_gives_up_after_the_timeout():
+    q = PublishQueue(lambda s: None, maxsize=1, policy="block", block_timeout=0.05)
+    start = time.monotonic()
+    assert fill(q, 2) == [True, False]
+    assert time.monotonic() - start >= 0.05
+
+def test_block_waits_for_the_worker_to_make_room():
+    sent = []
+    q = PublishQueue(lambda s: (time.sleep(0.02), sent.append(s.payload["n"])),
+                     maxsize=1, policy="block", block_timeout=None).start()
+    assert fill(q, 5) == [True] * 5
+    q.stop()
+    assert sent == [0, 1, 2, 3, 4]
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        PublishQueue(lambda s: None, policy="drop_everything")
+
+def test_slow_publisher_does_not_hold_up_the_collector():
+    release = threading.Event()
+    sent = []
+    q = PublishQueue(lambda s: (release.wait(), sent.append(s.payload["n"])), maxsize=10).start()
+    start = time.monotonic()
+    fill(q, 5)
+    assert time.monotonic() - start < 0.5
+    assert not q.drain(0.05)            # the first send is still stuck
+    release.set()
+    assert q.drain()
+    assert sent == [0, 1, 2, 3, 4]
+    q.stop()
+
+def test_slow_collector_does_not_hold_up_publishing():
+    got = threading.Event()
+    q = PublishQueue(lambda s: got.set()).start()
+    fill(q, 1)
+    # Sent as soon as it is queued, not when the next sample comes along
+    assert got.wait(1.0)
+    q.stop()
+
+def test_stop_sends_what_is_left_and_ends_the_worker():
+    sent = []
+    q = PublishQueue(lambda s: sent.append(s.payload["n"])).start()
+    fill(q, 20)
+    q.stop()
+    assert sent == list(range(20))
+    assert not q.thread.is_alive()
+
+def test_publish_errors_do_not_stop_the_worker():
+    sent = []
+
+    def send(sample):
+        if sample.payload["n"] == 1:
+            raise RuntimeError("broker gone")
+        sent.append(sample.payload["n"])
+
+    q = PublishQueue(send).start()
+    fill(q, 3)
+    assert q.drain()
+    assert sent == [0, 2]
+    q.stop()
+
+def test_recorder_runs_calls_in_order():
+    done = []
+    r = Recorder().start()
+    for i in range(10):
+        r.submit(done.append, i)
+    r.submit(lambda: 1 / 0)             # an error is logged, not raised
+    r.submit(done.append, 10)
+    r.stop()
+    assert done == list(range(11))
+    assert not r.thread.is_alive()
+
+def test_recorder_drops_when_full():
+    r = Recorder(maxsize=1, block_timeout=0.05)    # worker not started
+    assert r.submit(print, "first")
+    assert not r.submit(print, "second")
@@ -0,0 +1,66 @@
+import http.client
+import pytest
+import readapi
+
+@pytest.fixture
+def api():
+    snapshots = readapi.Snapshots()
+    server = readapi.serve(snapshots, 0, "SN", "127.0.0.1")
+    yield snapshots, http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    server.shutdown()
+    server.server_close()
+
+def test_latest_with_etag(api):
+    snapshots, conn = api
+    snapshots.update("SN", "power_data", {"pv": 1})
+    conn.request("GET", "/api/latest/power_data")
+    resp = conn.getresponse()
+    assert (resp.status, resp.read()) == (200, b'{"pv":1}')
+    conn.request("GET", "/api/latest/power_data", headers={"If-None-Match": resp.getheader("ETag")})
+    resp = conn.getresponse()
+    resp.read()
+    assert resp.status == 304
+
+def test_etags_from_before_a_restart_do_not_match(api, monkeypatch):
+    snapshots, conn = api
+    snapshots.update("SN", "power_data", {"pv": 1})
+    old = readapi.etag(1)
+    monkeypatch.setattr(readapi, "BOOT_ID", "restarted")
+    for path in ("/api/latest/power_data", "/api/latest"):
+        conn.request("GET", path, headers={"If-None-Match": old})
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 200
+        assert resp.getheader("ETag").startswith('"restarted-')
+
+def test_events_reject_a_bad_last_event_id(api):
+    _, conn = api
+    conn.request("GET", "/api/events", headers={"Last-Event-ID": "abc"})
+    resp = conn.getresponse()
+    assert resp.status == 400
+
+def test_events_resume_after_last_event_id(api):
+    snapshots, conn = api
+    snapshots.update("SN", "power_data", {"pv": 1})
+    snapshots.update("SN", "power_data", {"pv": 2})
+    conn.request("GET", "/api/events", headers={"Last-Event-ID": readapi.event_id(1)})
+    resp = conn.getresponse()
+    assert resp.status == 200
+    lines = [resp.fp.readline() for _ in range(3)]
+    assert lines == [f"id: {readapi.event_id(2)}\n".encode(), b"event: power_data\n",
+                     b'data: {"system":"SN","payload":{"pv":2}}\n']
+
+def test_events_after_a_restart_resend_the_latest(api):
+    snapshots, conn = api
+    snapshots.update("SN", "power_data", {"pv": 1})
+    snapshots.update("SN", "energy_stats", {"e": 5})
+    snapshots.update("SN", "power_data", {"pv": 2})
+    # The client last saw event 40 of an earlier boot, far past this one's versions
+    conn.request("GET", "/api/events", headers={"Last-Event-ID": "0123abcd-40"})
+    resp = conn.getresponse()
+    assert resp.status == 200
+    lines = [resp.fp.readline() for _ in range(8)]
+    assert lines[:3] == [f"id: {readapi.event_id(2)}\n".encode(), b"event: energy_stats\n",
+                         b'data: {"system":"SN","payload":{"e":5}}\n']
+    assert lines[4:7] == [f"id: {readapi.event_id(3)}\n".encode(), b"event: power_data\n",
+                          b'data: {"system":"SN","payload":{"pv":2}}\n']
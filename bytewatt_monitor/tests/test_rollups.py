@@ -0,0 +1,44 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from rollups import Rollups, signed_energy
+
+def today_at(hour):
+    return datetime.now().replace(hour=hour, minute=0, second=0, microsecond=0).timestamp()
+
+def test_zero_crossing_is_split_at_the_crossing():
+    pos, neg = signed_energy(np.array([-1000.0, 200.0]), np.array([1000.0, 600.0]), 60)
+    assert list(pos) == [15000.0, 24000.0]
+    assert list(neg) == [15000.0, 0.0]
+
+def test_battery_flipping_sign_within_an_interval():
+    r = Rollups(max_gap=7200)
+    start = today_at(1)
+    r.add(start, {"pv_production": 1000, "battery": -1000, "grid": 500})
+    r.add(start + 3600, {"pv_production": 1000, "battery": 1000, "grid": 500})
+    energy = r.current()
+    assert energy["pv_kwh"] == 1.0
+    assert energy["battery_charge_kwh"] == 0.25
+    assert energy["battery_discharge_kwh"] == 0.25
+    assert energy["grid_import_kwh"] == 0.5
+    assert energy["grid_export_kwh"] == 0.0
+
+def test_gaps_are_not_integrated():
+    r = Rollups(max_gap=600)
+    start = today_at(2)
+    r.add(start, {"load": 1000})
+    r.add(start + 1200, {"load": 1000})
+    assert r.current()["load_kwh"] == 0.0
+    assert r.gap_seconds == 1200
+
+def test_day_summary():
+    r = Rollups(max_gap=600)
+    start = today_at(3)
+    for i in range(7):
+        r.add(start + 600 * i, {"load": 500 + 100 * i})
+    day = datetime.fromtimestamp(start).strftime("%Y%m%d")
+    summary = r.summary(day)
+    assert summary["energy"]["load_kwh"] == 0.8
+    assert summary["power"]["load"]["min"] == 500 and summary["power"]["load"]["max"] == 1100
+    assert len(summary["hourly"]) == 2
+    assert sum(h["load_kwh"] for h in summary["hourly"]) == pytest.approx(0.8)
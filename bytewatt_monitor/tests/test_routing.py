@@ -0,0 +1,72 @@
+import json
+import pytest
+from correlate import RequestTracker
+from direct import ApiResponse
+
+URL = "https://cloud.test/api/report/energyStorage/getLastPowerData?sysSn=SN&stationId=ST"
+KEY = ("SN", "power")
+
+class BrowserResponse:
+    """The parts of a Playwright response handle_response uses."""
+    def __init__(self, url, body, headers):
+        self.url = url
+        self.status = 200
+        self.request = type("Request", (), {"headers": headers})()
+        self._body = body
+
+    def body(self):
+        return self._body
+
+def power_body(pv):
+    return json.dumps({"code": 200, "msg": "Success", "data": {"pvPower": pv}}).encode()
+
+def tagged(pv, seq):
+    return BrowserResponse(URL, power_body(pv), {"x-poll-seq": str(seq)})
+
+def published_pv(mqtt_client):
+    return [json.loads(p)["power_stats"]["pv_production"]
+            for t, p in mqtt_client.sent if t == "bytewatt/power_data"]
+
+@pytest.fixture
+def tracker(run, monkeypatch):
+    t = RequestTracker(deadline=10)
+    monkeypatch.setattr(run, "tracker", t)
+    return t
+
+def start_cycles(tracker, n):
+    for _ in range(n):
+        tracker.begin(KEY, tracker.next_cycle())
+
+def test_untagged_browser_responses_are_dropped(run, tracker, mqtt_client):
+    start_cycles(tracker, 1)
+    # The dashboard's own polling carries no cycle tag
+    run.handle_response(BrowserResponse(URL, power_body(100), {}), mqtt_client)
+    run.handle_response(BrowserResponse(URL, power_body(200), {"x-poll-seq": "junk"}), mqtt_client)
+    assert published_pv(mqtt_client) == []
+    run.handle_response(tagged(300, 1), mqtt_client)
+    assert published_pv(mqtt_client) == [300]
+    assert not tracker.pending[KEY]
+
+def test_an_older_cycle_arriving_late_is_dropped(run, tracker, mqtt_client):
+    start_cycles(tracker, 3)
+    run.handle_response(tagged(200, 2), mqtt_client)
+    run.handle_response(tagged(100, 1), mqtt_client)      # overtaken by cycle 2
+    run.handle_response(tagged(300, 3), mqtt_client)
+    assert published_pv(mqtt_client) == [200, 300]
+
+def test_direct_responses_route_by_their_seq(run, tracker, mqtt_client):
+    start_cycles(tracker, 2)
+    run.handle_response(ApiResponse(URL, 200, power_body(200), seq=2), mqtt_client)
+    run.handle_response(ApiResponse(URL, 200, power_body(100), seq=1), mqtt_client)
+    # Archive replays have no cycle and are always handled
+    run.handle_response(ApiResponse(URL, 200, power_body(50)), mqtt_client)
+    assert published_pv(mqtt_client) == [200, 50]
+
+def test_unknown_urls_and_systems_are_ignored(run, tracker, mqtt_client):
+    start_cycles(tracker, 1)
+    run.handle_response(BrowserResponse(URL.replace("SN", "OTHER"), power_body(1), {"x-poll-seq": "1"}),
+                        mqtt_client)
+    run.handle_response(BrowserResponse("https://cloud.test/api/other?sysSn=SN", power_body(1),
+                                        {"x-poll-seq": "1"}), mqtt_client)
+    assert mqtt_client.sent == []
+    assert tracker.pending[KEY]                            # still waiting for its answer
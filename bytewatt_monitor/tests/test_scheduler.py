@@ -0,0 +1,57 @@
+import pytest
+from scheduler import Scheduler, MAX_CATCHUP, parse_hhmm
+
+def schedule(clock, policy):
+    sched = Scheduler(clock=clock)
+    runs = []
+    job = sched.every(10, lambda: runs.append(clock.now), name="poll", policy=policy)
+    return sched, job, runs
+
+def test_runs_on_a_fixed_grid(clock):
+    sched, job, runs = schedule(clock, "skip")
+    clock.now = 10.7
+    assert sched.run_pending() == 9.3     # late runs do not push the grid
+    clock.now = 20.0
+    sched.run_pending()
+    assert runs == [10.7, 20.0]
+    assert job.missed == 0
+
+def test_skip_runs_once_and_realigns(clock):
+    sched, job, runs = schedule(clock, "skip")
+    clock.now = 35.0
+    assert sched.run_pending() == 5.0
+    assert len(runs) == 1
+    assert job.missed == 2
+
+def test_catchup_runs_missed_ticks(clock):
+    sched, job, runs = schedule(clock, "catchup")
+    clock.now = 35.0
+    sched.run_pending()
+    assert len(runs) == 3
+    assert job.missed == 2
+
+def test_catchup_is_capped(clock):
+    sched, job, runs = schedule(clock, "catchup")
+    clock.now = 1000.0
+    sched.run_pending()
+    assert len(runs) == 1 + MAX_CATCHUP
+
+def test_run_sleeps_through_the_given_wait(clock):
+    sched, job, runs = schedule(clock, "skip")
+    waits = []
+
+    def wait(seconds):
+        waits.append(seconds)
+        clock.now += seconds
+        if len(runs) == 3:
+            sched.stop()
+
+    sched.run(wait)
+    assert runs == [10.0, 20.0, 30.0]
+    assert waits == [10.0] * 4
+
+def test_parse_hhmm_rejects_anything_but_a_time_of_day():
+    assert parse_hhmm(" 02:30 ") == (2, 30)
+    for bad in ("2am", "24:00", "12:60", "1:2:3", ""):
+        with pytest.raises(ValueError):
+            parse_hhmm(bad)
@@ -0,0 +1,79 @@
+import time
+import paho.mqtt.client as mqtt
+from spool import Spool, SpooledClient
+
+def wait_until(cond, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return cond()
+
+def test_replays_in_order_after_outage(tmp_path, broker):
+    client = mqtt.Client()
+    client.reconnect_delay_set(min_delay=1, max_delay=1)
+    spooled = SpooledClient(client, Spool(str(tmp_path)))
+    client.on_connect = lambda *args: spooled.resume()
+    client.connect("127.0.0.1", broker.port)
+    client.loop_start()
+    try:
+        assert wait_until(client.is_connected)
+        spooled.publish("t/live", "before")
+        assert broker.wait_for(1)[-1][2] == b"before"
+
+        broker.stop()
+        assert wait_until(lambda: not client.is_connected())
+        for i in range(20):
+            spooled.publish("t/n", str(i))
+        assert spooled.spool.queued == 20
+
+        broker.start()
+        messages = broker.wait_for(21)
+        assert [m[2] for m in messages[1:]] == [str(i).encode() for i in range(20)]
+        assert wait_until(lambda: spooled.spool.queued == 0)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        spooled.spool.close()
+
+def test_drops_oldest_when_full(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=2000, segment_bytes=500)
+    for i in range(100):
+        spool.append("t/n", str(i), False)
+    assert spool.dropped > 0
+    assert spool.queued == 100 - spool.dropped
+    records = [rec["p"] for _, rec in spool.next_batch(1000)]
+    assert records == [str(i) for i in range(spool.dropped, 100)]
+    spool.close()
+
+def test_resumes_from_cursor_after_restart(tmp_path):
+    spool = Spool(str(tmp_path))
+    for i in range(10):
+        spool.append("t/n", str(i), True)
+    batch = spool.next_batch(4)
+    spool.commit(batch[-1][0])
+    spool.close()
+
+    reopened = Spool(str(tmp_path))
+    assert reopened.queued == 6
+    assert [rec["p"] for _, rec in reopened.next_batch(10)] == [str(i) for i in range(4, 10)]
+    reopened.close()
+
+def test_commit_after_the_replayed_segment_was_dropped(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=2000, segment_bytes=500)
+    for i in range(100):                      # at the cap after a long outage
+        spool.append("t/n", str(i), False)
+    batch = spool.next_batch(5)
+    for i in range(100, 150):                 # live publishes push the batch's segment out
+        spool.append("t/n", str(i), False)
+    spool.commit(batch[-1][0])
+    left = [rec["p"] for _, rec in spool.next_batch(1000)]
+    assert spool.queued == len(left)
+    assert left[-1] == "149"
+    while True:
+        batch = spool.next_batch(7)
+        if not batch:
+            break
+        spool.commit(batch[-1][0])
+    assert spool.queued == 0
+    spool.close()
+    assert Spool(str(tmp_path)).queued == 0
@@ -0,0 +1,102 @@
+import os
+from datetime import datetime, timedelta
+from tsstore import TimeSeriesStore
+
+FIELDS = {"power": ["pv", "load"]}
+
+def day_start(days_ago, now):
+    return (now - timedelta(days=days_ago)).replace(hour=12, minute=0, second=0, microsecond=0).timestamp()
+
+def test_query_range(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), FIELDS)
+    now = datetime.now()
+    base = day_start(1, now)
+    for i in range(10):
+        store.append("power", {"pv": i, "load": 2 * i}, base + 10 * i)
+    rows = store.query("power", base + 20, base + 50)
+    assert [r["timestamp"] for r in rows] == [base + 20, base + 30, base + 40]
+    assert [(r["pv"], r["load"]) for r in rows] == [(2, 4), (3, 6), (4, 8)]
+    assert store.query("power", base - 100, base) == []
+    store.close()
+
+def test_query_spans_days_and_keys(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), FIELDS)
+    now = datetime.now()
+    older, newer = day_start(2, now), day_start(1, now)
+    store.append("power", {"pv": 1}, older)
+    store.append("power", {"pv": 2}, newer)
+    store.append("power", {"pv": 9}, newer, key="second")
+    assert [r["pv"] for r in store.query("power", older, newer + 1)] == [1, 2]
+    assert [r["pv"] for r in store.query("power", older, newer + 1, key="second")] == [9]
+    store.close()
+
+def test_compaction_and_retention(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), FIELDS, raw_days=7, compact_seconds=60, retention_days=30)
+    now = datetime.now()
+    old = day_start(10, now)
+    old = old - old % 60
+    for i in range(12):                      # two 60 s buckets of six 10 s samples
+        store.append("power", {"pv": i, "load": 100}, old + 10 * i)
+    expired = day_start(40, now)
+    store.append("power", {"pv": 1}, expired)
+    recent = day_start(1, now)
+    store.append("power", {"pv": 5}, recent)
+    store.close()
+
+    store.compact(now)
+    names = sorted(os.listdir(tmp_path / "power"))
+    old_day = datetime.fromtimestamp(old).strftime("%Y%m%d")
+    recent_day = datetime.fromtimestamp(recent).strftime("%Y%m%d")
+    assert names == [f"{old_day}.c60.seg", f"{recent_day}.seg"]
+    rows = store.query("power", old, old + 3600)
+    assert [(r["timestamp"], r["pv"], r["load"]) for r in rows] == [(old, 2.5, 100), (old + 60, 8.5, 100)]
+    assert [r["pv"] for r in store.query("power", recent, recent + 1)] == [5]
+
+def test_compaction_runs_in_the_background_one_at_a_time(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), FIELDS, raw_days=7)
+    old = day_start(10, datetime.now())
+    store.append("power", {"pv": 1}, old)
+    store.close()
+    old_day = datetime.fromtimestamp(old).strftime("%Y%m%d")
+    with store.compacting:
+        store.start_compact().join()        # another compaction is still running
+        assert os.listdir(tmp_path / "power") == [f"{old_day}.seg"]
+    store.start_compact().join()
+    assert os.listdir(tmp_path / "power") == [f"{old_day}.c60.seg"]
+
+def test_schema_change_rolls_the_day_over(tmp_path):
+    now = datetime.now()
+    base = day_start(1, now)
+    old = TimeSeriesStore(str(tmp_path), {"power": ["pv", "load"]})
+    old.append("power", {"pv": 1, "load": 2}, base)
+    old.close()
+
+    new = TimeSeriesStore(str(tmp_path), {"power": ["pv", "soc", "load"]})
+    new.append("power", {"pv": 3, "soc": 50, "load": 4}, base + 10)
+    rows = new.query("power", base, base + 60)
+    assert rows == [{"timestamp": base, "pv": 1, "soc": 0, "load": 2},
+                    {"timestamp": base + 10, "pv": 3, "soc": 50, "load": 4}]
+    new.close()
+
+    # Compaction folds both segments of the day into one of the current schema
+    new.raw_days = 0
+    new.compact(now)
+    day = datetime.fromtimestamp(base).strftime("%Y%m%d")
+    assert os.listdir(tmp_path / "power") == [f"{day}.c60.seg"]
+    assert new.query("power", base, base + 60) == [{"timestamp": base, "pv": 2, "soc": 25, "load": 3}]
+
+def test_appends_after_a_torn_record(tmp_path):
+    base = day_start(1, datetime.now())
+    store = TimeSeriesStore(str(tmp_path), FIELDS)
+    store.append("power", {"pv": 1, "load": 2}, base)
+    store.close()
+    day = datetime.fromtimestamp(base).strftime("%Y%m%d")
+    with open(tmp_path / "power" / f"{day}.seg", "ab") as f:
+        f.write(b"\x01\x02\x03")            # power cut part-way through a record
+
+    store = TimeSeriesStore(str(tmp_path), FIELDS)
+    store.append("power", {"pv": 3, "load": 4}, base + 10)
+    store.append("power", {"pv": 5, "load": 6}, base + 20)
+    rows = store.query("power", base, base + 60)
+    assert [(r["pv"], r["load"]) for r in rows] == [(1, 2), (3, 4), (5, 6)]
+    store.close()
@@ -0,0 +1,86 @@
+from watchdog import Watchdog
+
+def test_escalates_until_a_good_response(clock):
+    dog = Watchdog(["page", "context", "restart"], stale_s=600, grace_s=120, clock=clock)
+    actions = []
+    for minute in range(1, 40):
+        clock.now = minute * 60
+        found = dog.check(0, 0, 0, 0)
+        if found:
+            actions.append((clock.now, found[0]))
+            dog.recycled(found[0], 1.0)
+    assert actions[:3] == [(660, "page"), (1320, "context"), (1980, "restart")]
+
+    dog.note_response()
+    clock.now += 700
+    assert dog.check(0, 0, 0, 0)[0] == "page"
+
+def test_grace_period_after_a_recycle(clock):
+    dog = Watchdog(["page", "context"], browser_mb=100, grace_s=120, clock=clock)
+    big = 200 * 2**20
+    assert dog.check(big, 0, 0, 0)[0] == "page"
+    dog.recycled("page", 1.0)
+    clock.now = 60
+    assert dog.check(big, 0, 0, 0) is None
+    clock.now = 180
+    assert dog.check(big, 0, 0, 0)[0] == "context"
+
+def test_memory_ladder_escalates_while_polling_works(clock):
+    dog = Watchdog(["page", "context", "restart"], browser_mb=100, grace_s=120, clock=clock)
+    big = 200 * 2**20
+    actions = []
+    for minute in range(1, 12):
+        clock.now = minute * 60
+        dog.note_response()
+        found = dog.check(big, 0, 0, 0)
+        if found:
+            actions.append(found[0])
+            dog.recycled(found[0], 1.0)
+    assert actions[:3] == ["page", "context", "restart"]
+
+    clock.now += 600
+    assert dog.check(0, 0, 0, 0) is None      # back under the limit
+    assert dog.check(big, 0, 0, 0)[0] == "page"
+
+def test_error_rate_counts_unreadable_responses(clock):
+    dog = Watchdog(["page"], error_rate=0.5, clock=clock)
+    assert dog.check(0, 0, 0, 10) == ("page", "handler error rate 100%")
+
+def test_staleness_allows_for_the_poll_interval(clock):
+    dog = Watchdog(["page"], stale_s=600, clock=clock)
+    clock.now = 700
+    assert dog.check(0, 0, 0, 0, interval=900) is None
+    clock.now = 1900
+    assert dog.check(0, 0, 0, 0, interval=900)[0] == "page"
+
+def test_server_errors_are_not_staleness(clock):
+    dog = Watchdog(["page", "context", "restart"], stale_s=600, grace_s=120, clock=clock)
+    for minute in range(1, 40):
+        clock.now = minute * 60
+        dog.note_response()                   # an HTTP 500 still proves the page works
+        assert dog.check(0, 0, 0, 0) is None
+    clock.now += 700                          # then no response at all
+    assert dog.check(0, 0, 0, 0) == ("page", "no good response for 700s")
+
+def test_transport_failures_never_reach_the_restart(clock):
+    dog = Watchdog(["page", "context", "restart"], stale_s=600, grace_s=120, clock=clock)
+    actions = []
+    for minute in range(1, 60):
+        clock.now = minute * 60
+        dog.note_transport_error()            # the network is down
+        found = dog.check(0, 0, 0, 0)
+        if found:
+            actions.append(found[0])
+            dog.recycled(found[0], 1.0)
+    assert actions[:2] == ["page", "context"]
+    assert "restart" not in actions
+
+    clock.now = 60 * 60
+    dog.note_response()                       # back online, then stuck without errors
+    for minute in range(60, 120):
+        clock.now = minute * 60
+        found = dog.check(0, 0, 0, 0)
+        if found:
+            actions.append(found[0])
+            dog.recycled(found[0], 1.0)
+    assert actions[-1] == "restart"
@@ -0,0 +1,262 @@
+# tsstore.py
+# Append-only binary time-series store. Each series gets one segment file per
+# day holding a small header, the field names, then fixed-width records:
+#   uint32 epoch seconds + one float32 per field (little endian)
+# Segments are memory-mapped for reads. Old days are compacted into coarser
+# buckets and eventually deleted, so months of 10-second samples stay small.
+#
+# Segments describe their own fields, so the schema can change: appending
+# with a different field list rolls the day over to a new segment, and reads
+# map every segment onto the current fields (missing ones read as 0).
+import mmap, os, struct, threading, time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+MAGIC = b"BWTS"
+VERSION = 1
+# magic, version, record size, field count, bucket seconds (0 = raw), length
+# of the comma-separated field names that follow
+HEADER = struct.Struct("<4sHHHHI")
+
+def record_struct(fields):
+    return struct.Struct("<I" + "f" * len(fields))
+
+def segment_header(fields, bucket=0):
+    names = ",".join(fields).encode()
+    return HEADER.pack(MAGIC, VERSION, record_struct(fields).size, len(fields), bucket, len(names)) + names
+
+class TimeSeriesStore:
+    """Segments live at <root>/<kind>[/<key>]/<YYYYMMDD>[.r<n>|.c<secs>].seg.
+
+    .r<n> are earlier raw segments of a day, rolled over on a schema change;
+    .c<secs> is a day compacted to buckets of that many seconds.
+    """
+    def __init__(self, root, schemas, raw_days=7, compact_seconds=60, retention_days=365):
+        self.root = root
+        self.schemas = {kind: tuple(fields) for kind, fields in schemas.items()}
+        self.raw_days = raw_days
+        self.compact_seconds = compact_seconds
+        self.retention_days = retention_days
+        self.lock = threading.Lock()
+        self.compacting = threading.Lock()
+        self.open_segments = {}   # (kind, key) -> (day, file)
+
+    def _dir(self, kind, key=""):
+        return os.path.join(self.root, kind, key) if key else os.path.join(self.root, kind)
+
+    def _segment(self, kind, key, day):
+        """Open (creating if needed) today's raw segment for appending."""
+        current = self.open_segments.get((kind, key))
+        if current and current[0] == day:
+            return current[1]
+        if current:
+            current[1].close()
+        fields = self.schemas[kind]
+        directory = self._dir(kind, key)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{day}.seg")
+        if os.path.exists(path) and os.path.getsize(path) and self._fields(path) != fields:
+            self._roll_over(directory, day, path)
+        f = open(path, "ab")
+        if f.tell() == 0:
+            f.write(segment_header(fields))
+        else:
+            self._trim(f, path, fields)
+        self.open_segments[(kind, key)] = (day, f)
+        return f
+
+    def _trim(self, f, path, fields):
+        """Cut a partial record left by a crash mid-write, so appends stay aligned."""
+        base = len(segment_header(fields))
+        extra = (f.tell() - base) % record_struct(fields).size
+        if extra:
+            f.truncate(f.tell() - extra)
+            print(f"{path}: dropped {extra} bytes of a partial record")
+
+    def _roll_over(self, directory, day, path):
+        """Move a day's segment of an older schema aside so the new one starts afresh."""
+        n = 1
+        while os.path.exists(os.path.join(directory, f"{day}.r{n:02d}.seg")):
+            n += 1
+        os.replace(path, os.path.join(directory, f"{day}.r{n:02d}.seg"))
+        print(f"{path}: field list changed, earlier samples kept in {day}.r{n:02d}.seg")
+
+    def append(self, kind, values, ts=None, key=""):
+        """Append one sample; values is a dict holding the kind's fields."""
+        ts = time.time() if ts is None else ts
+        fields = self.schemas[kind]
+        record = record_struct(fields).pack(int(ts), *(float(values.get(n) or 0) for n in fields))
+        day = datetime.fromtimestamp(ts).strftime("%Y%m%d")
+        with self.lock:
+            f = self._segment(kind, key, day)
+            f.write(record)
+            f.flush()
+
+    def _segments(self, kind, key=""):
+        """(day, bucket seconds, path) for every segment, oldest first."""
+        directory = self._dir(kind, key)
+        if not os.path.isdir(directory):
+            return []
+        out = []
+        for name in os.listdir(directory):
+            if not name.endswith(".seg"):
+                continue
+            parts = name[:-4].split(".")
+            bucket = int(parts[1][1:]) if len(parts) > 1 and parts[1].startswith("c") else 0
+            out.append((parts[0], bucket, os.path.join(directory, name)))
+        # Within a day, rolled-over .r<n> segments sort before the live one
+        return sorted(out)
+
+    def _layout(self, mm):
+        """(segment fields, record struct, offset of the first record) from a mapped header."""
+        magic, version, rec_size, count, _, names_len = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a segment")
+        seg_fields = tuple(bytes(mm[HEADER.size:HEADER.size + names_len]).decode().split(","))
+        rec = record_struct(seg_fields)
+        if len(seg_fields) != count or rec.size != rec_size:
+            raise ValueError("record size does not match its fields")
+        return seg_fields, rec, HEADER.size + names_len
+
+    def _fields(self, path):
+        """Fields a segment holds (None if it cannot be read)."""
+        try:
+            with open(path, "rb") as f:
+                head = f.read(4096)
+            if len(head) < HEADER.size:
+                return None
+            return self._layout(head)[0]
+        except ValueError:
+            return None
+
+    def _read(self, path, fields, start=None, end=None):
+        """Records in [start, end) from one segment, as tuples in the order of fields."""
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HEADER.size:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                try:
+                    seg_fields, rec, base = self._layout(mm)
+                except ValueError as e:
+                    raise ValueError(f"{path}: {e}")
+                count = (size - base) // rec.size
+                # Records are appended in time order, so the range can be bisected
+                stamps = _Stamps(mm, base, rec.size, count)
+                lo = bisect_left(stamps, start) if start is not None else 0
+                hi = bisect_left(stamps, end) if end is not None else count
+                rows = [rec.unpack_from(mm, base + i * rec.size) for i in range(lo, hi)]
+        if seg_fields == fields:
+            return rows
+        cols = [seg_fields.index(n) + 1 if n in seg_fields else None for n in fields]
+        return [(row[0],) + tuple(row[c] if c else 0.0 for c in cols) for row in rows]
+
+    def query(self, kind, start, end, key=""):
+        """Samples with start <= timestamp < end (epoch seconds), as dicts, oldest first."""
+        fields = self.schemas[kind]
+        first = datetime.fromtimestamp(start).strftime("%Y%m%d")
+        last = datetime.fromtimestamp(end).strftime("%Y%m%d")
+        with self.lock:
+            for _, f in self.open_segments.values():
+                f.flush()
+        out = []
+        for day, _, path in self._segments(kind, key):
+            if first <= day <= last:
+                try:
+                    rows = self._read(path, fields, int(start), int(end))
+                except ValueError as e:
+                    print(f"Skipping unreadable segment {e}")
+                    continue
+                except FileNotFoundError:
+                    continue    # compacted away since it was listed
+                for row in rows:
+                    sample = {"timestamp": row[0]}
+                    sample.update(zip(fields, row[1:]))
+                    out.append(sample)
+        return out
+
+    def start_compact(self):
+        """Compact on a background thread, so a long run never holds up polling."""
+        t = threading.Thread(target=self.compact, name="ts_compact", daemon=True)
+        t.start()
+        return t
+
+    def compact(self, now=None):
+        """Downsample raw segments older than raw_days; delete anything past retention_days."""
+        if not self.compacting.acquire(blocking=False):
+            return
+        try:
+            self._compact(now or datetime.now())
+        finally:
+            self.compacting.release()
+
+    def _compact(self, now):
+        compact_before = (now - timedelta(days=self.raw_days)).strftime("%Y%m%d")
+        drop_before = (now - timedelta(days=self.retention_days)).strftime("%Y%m%d")
+        with self.lock:
+            busy = {f.name for _, f in self.open_segments.values()}
+        for kind, fields in self.schemas.items():
+            for key in self._keys(kind):
+                raw = {}     # day -> raw segment paths, oldest first
+                for day, bucket, path in self._segments(kind, key):
+                    if path in busy:
+                        continue
+                    if day < drop_before:
+                        os.remove(path)
+                    elif day < compact_before and bucket == 0:
+                        raw.setdefault(day, []).append(path)
+                for day, paths in raw.items():
+                    try:
+                        self._downsample(paths, fields, day, kind, key)
+                    except ValueError as e:
+                        print(f"Not compacting unreadable segment {e}")
+
+    def _keys(self, kind):
+        directory = self._dir(kind)
+        if not os.path.isdir(directory):
+            return []
+        keys = [""]
+        keys += [d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d))]
+        return keys
+
+    def _downsample(self, paths, fields, day, kind, key):
+        """Replace a day's raw segments by per-bucket means, keyed on the bucket start."""
+        rec = record_struct(fields)
+        secs = self.compact_seconds
+        buckets = {}
+        for path in paths:
+            for row in self._read(path, fields):
+                acc = buckets.setdefault(row[0] - row[0] % secs, [0] + [0.0] * len(fields))
+                acc[0] += 1
+                for i, v in enumerate(row[1:], 1):
+                    acc[i] += v
+        out = os.path.join(self._dir(kind, key), f"{day}.c{secs}.seg")
+        tmp = out + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(segment_header(fields, secs))
+            for start in sorted(buckets):
+                acc = buckets[start]
+                f.write(rec.pack(start, *(v / acc[0] for v in acc[1:])))
+        os.replace(tmp, out)
+        for path in paths:
+            os.remove(path)
+
+    def close(self):
+        with self.lock:
+            for _, f in self.open_segments.values():
+                f.close()
+            self.open_segments.clear()
+
+class _Stamps:
+    """Sequence view over the timestamp column of a mapped segment, for bisect."""
+    def __init__(self, mm, base, rec_size, count):
+        self.mm = mm
+        self.base = base
+        self.rec_size = rec_size
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return struct.unpack_from("<I", self.mm, self.base + i * self.rec_size)[0]
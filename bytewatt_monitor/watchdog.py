@@ -0,0 +1,111 @@
+# watchdog.py
+# Decides when the polling machinery needs recycling, from memory use,
+# response staleness and the handler error rate. Each check that finds a
+# problem climbs one step up a ladder of remedies (e.g. page -> context ->
+# restart), so a full re-exec happens when the cheaper recycles did not help.
+# Every problem has its own rung, cleared only by its own recovery: memory
+# back under the limit, a good response, or a healthy error rate. Staleness
+# while requests fail at the transport level (network or cloud down) stops
+# short of the last rung: a re-exec cannot bring the network back, and might
+# not get past the login while it is gone.
+import time
+import metrics
+
+RECYCLES = metrics.Counter("bytewatt_recycles_total", "Watchdog recycles", ["action"])
+RECYCLE_SECONDS = metrics.Histogram("bytewatt_recycle_seconds", "Duration of a watchdog recycle", ["action"],
+                                    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60))
+
+class Watchdog:
+    def __init__(self, ladder, browser_mb=0, python_mb=0, stale_s=0, error_rate=0.0,
+                 min_responses=5, grace_s=120, clock=time.monotonic):
+        """Thresholds of 0 are disabled; ladder is the remedies in escalating order.
+
+        For grace_s after a recycle no check acts, giving the fresh page or
+        session time to settle.
+        """
+        self.ladder = ladder
+        self.browser_mb = browser_mb
+        self.python_mb = python_mb
+        self.stale_s = stale_s
+        self.error_rate = error_rate
+        self.min_responses = min_responses
+        self.grace_s = grace_s
+        self.clock = clock
+        self.levels = {"memory": 0, "stale": 0, "errors": 0}
+        self.last_ok = clock()
+        self.last_transport_error = None
+        self.last_recycle = None
+        self.seen = (0, 0)      # cumulative (responses, errors) at the last check
+
+    @property
+    def level(self):
+        return max(self.levels.values())
+
+    def note_response(self):
+        """A good response (or any sign the cloud is answering): not stale any more."""
+        self.last_ok = self.clock()
+        self.levels["stale"] = 0
+
+    def note_transport_error(self):
+        """A request got no response at all (connection refused, DNS, timeout)."""
+        self.last_transport_error = self.clock()
+
+    def offline(self):
+        """True if requests have failed to get any response since the last good one."""
+        return self.last_transport_error is not None and self.last_transport_error >= self.last_ok
+
+    def problems(self, browser_rss, python_rss, responses, errors, interval=0):
+        """{problem: reason} for each threshold crossed (empty when healthy).
+
+        interval is the current poll interval: staleness is only judged over
+        at least two of them, so a backed-off poller is not taken for a stuck one.
+        """
+        out = {}
+        if self.browser_mb and browser_rss > self.browser_mb * 2**20:
+            out["memory"] = f"browser RSS {browser_rss / 2**20:.0f} MB > {self.browser_mb} MB"
+        if self.python_mb and python_rss > self.python_mb * 2**20:
+            out["memory"] = f"python RSS {python_rss / 2**20:.0f} MB > {self.python_mb} MB"
+        if not out:
+            self.levels["memory"] = 0
+        # Staleness counts from the last recycle too, so each step of the
+        # ladder gets a full stale_s to show it helped
+        stale = self.clock() - max(self.last_ok, self.last_recycle or self.last_ok)
+        if self.stale_s and stale > max(self.stale_s, 2 * interval):
+            out["stale"] = f"no good response for {stale:.0f}s"
+        new_responses, new_errors = responses - self.seen[0], errors - self.seen[1]
+        self.seen = (responses, errors)
+        # Unreadable responses count as errors but not as responses
+        handled = new_responses + new_errors
+        if self.error_rate and handled >= self.min_responses:
+            rate = new_errors / handled
+            if rate > self.error_rate:
+                out["errors"] = f"handler error rate {rate:.0%}"
+            else:
+                self.levels["errors"] = 0
+        return out
+
+    def check(self, browser_rss, python_rss, responses, errors, interval=0):
+        """(action, reason) if something should be recycled, else None."""
+        found = self.problems(browser_rss, python_rss, responses, errors, interval)
+        if self.last_recycle is not None and self.clock() - self.last_recycle < self.grace_s:
+            return None
+        if not found:
+            return None
+        if self.python_mb and python_rss > self.python_mb * 2**20:
+            # Our own heap is not given back by recycling the browser
+            action = self.ladder[-1]
+        else:
+            step = max(self.levels[p] for p in found)
+            top = len(self.ladder) - 1
+            if set(found) == {"stale"} and self.offline():
+                top = max(top - 1, 0)
+            action = self.ladder[min(step, top)]
+        for problem in found:
+            self.levels[problem] += 1
+        return action, "; ".join(found.values())
+
+    def recycled(self, action, seconds):
+        """Record a finished recycle; each rung is kept until its problem clears."""
+        RECYCLES.inc(action=action)
+        RECYCLE_SECONDS.observe(seconds, action=action)
+        self.last_recycle = self.clock()